@@ -0,0 +1,68 @@
+"""
+Wake asyncio coroutines from the detection threads.
+
+FrameHub, EventLog and SessionManager signal their threaded waiters with a
+threading.Condition. Coroutines on the ASGI event loop must not block on
+one, so each also keeps a Waiters set: a coroutine registers an
+asyncio.Event, and whoever notifies the condition calls wake_all(), which
+sets every registered event on its own loop with call_soon_threadsafe.
+"""
+
+import asyncio
+
+
+class Waiters:
+    """asyncio.Events to set from any thread; guard calls with the owner's lock."""
+
+    def __init__(self):
+        self.events = {}     # asyncio.Event -> the loop it belongs to
+
+    def add(self):
+        event = asyncio.Event()
+        self.events[event] = asyncio.get_running_loop()
+        return event
+
+    def discard(self, event):
+        self.events.pop(event, None)
+
+    def wake_all(self):
+        # One thread-safe call per loop, however many coroutines are waiting on it
+        by_loop = {}
+        for event, loop in self.events.items():
+            by_loop.setdefault(loop, []).append(event)
+        for loop, events in by_loop.items():
+            loop.call_soon_threadsafe(_set_all, events)
+
+
+def _set_all(events):
+    for event in events:
+        event.set()
+
+
+async def wait_for(lock, waiters, predicate, timeout=None):
+    """Coroutine counterpart of Condition.wait_for: True once predicate() holds, False on timeout.
+
+    `lock` must be the lock the notifier holds while it changes state and
+    calls waiters.wake_all().
+    """
+    with lock:
+        if predicate():
+            return True
+        event = waiters.add()
+    try:
+        deadline = None if timeout is None else asyncio.get_running_loop().time() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - asyncio.get_running_loop().time()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return False
+            with lock:
+                event.clear()
+                if predicate():
+                    return True
+    finally:
+        with lock:
+            waiters.discard(event)
@@ -0,0 +1,260 @@
+"""
+Offline analysis of recorded exam sessions.
+
+Re-runs detection on video files without display, speech or email, faster
+than real time. Each file is split into time chunks that a process pool
+runs through FaceMesh, Hands and the phone detector; workers send back only
+the compact per-frame features. The chunks of every file are queued up
+front, so the pool stays busy across file boundaries while files are
+scored one after another in order. The parent then scores every frame in
+timestamp order with the same FrameScorer the live app uses, so timers,
+counters and temporal-rule windows carry across chunk boundaries exactly as
+if the file had been processed in one pass. With MOUTH_MOTION_TRACKING the
+workers also run the live app's MouthMotionDetector, starting each chunk a
+little early so the tracker is warm at its first frame, and speaking is
+judged the way the live loop judges it.
+
+Violations are reported in the schema of the `violations` table, with
+`time` taken from the recording (its start time plus the frame offset).
+Unlike the live loop, scoring does not stop after MAX_WARNINGS, so a review
+sees every violation in the recording.
+
+Usage:
+    python analyze.py recording.mp4 --student-id s42
+    python analyze.py recordings/ --workers 8 --chunk 60 --db review.db --csv review.csv
+"""
+
+import argparse
+import csv
+import datetime
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+from utils import video_files
+
+FIELDS = ('student_id', 'exam_name', 'violation', 'time', 'warning_count', 'screenshot')
+
+# Per-process model state, set up by _init_worker
+_yolo_model = None
+
+
+def _init_worker(threads):
+    global _yolo_model
+    import cv2
+    from backends import load_yolo
+
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _yolo_model = load_yolo()
+
+
+def _analyse_chunk(path, start, end, fps, stride):
+    """Detect on frames [start, end) of a file; return [(t, FrameFeatures, boxes, frame_height, mouth_motion)]."""
+    import cv2
+    import mediapipe as mp
+    from features import WRIST, face_features, frame_features
+    from mouth import MouthMotionDetector
+    from phone_detector import PhoneDetector
+
+    face_mesh = mp.solutions.face_mesh.FaceMesh(refine_landmarks=True, max_num_faces=1)
+    hands = mp.solutions.hands.Hands(max_num_hands=2, min_detection_confidence=0.6, min_tracking_confidence=0.6)
+    phone_detector = PhoneDetector(_yolo_model, conf=0.5, iou=0.5)
+    mouth = MouthMotionDetector() if config.MOUTH_MOTION_TRACKING else None
+    # Run the mouth tracker over the frames just before the chunk (its start-up skip plus
+    # its longest motion history) so its first readings match a single pass over the file
+    preroll = int((mouth.skip_time + 2 * mouth.motion_time) * fps) + 1 if mouth is not None else 0
+    first = max(start - preroll, 0)
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+    out = []
+    try:
+        for index in range(first, end):
+            if (index - start) % stride:
+                if not cap.grab():
+                    break
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            face = face_features(face_mesh.process(rgb))
+            mouth_motion = None
+            if mouth is not None:
+                mouth.locate(face, frame.shape)
+                mouth_motion = mouth.update(frame, index / fps)
+            if index < start:
+                continue
+            hand_results = hands.process(rgb)
+            boxes = phone_detector.detect(frame, hand_results.multi_hand_landmarks)
+            feats = frame_features(face, hand_results)
+            # The scorer only needs the wrist of each hand; keep the results small
+            feats = feats._replace(hands=feats.hands[:, WRIST:WRIST + 1])
+            out.append((index / fps, feats, boxes, frame.shape[0], mouth_motion))
+    finally:
+        cap.release()
+        face_mesh.close()
+        hands.close()
+    return out
+
+
+def probe(path):
+    """Return (fps, frame_count) of a video file."""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return fps, count
+
+
+def recording_start(path, duration):
+    """Best guess at when a recording started: its modification time minus its length."""
+    return datetime.datetime.fromtimestamp(os.path.getmtime(path) - duration)
+
+
+def save_frame(path, t, fps, tag, screenshots_dir="screenshots"):
+    import cv2
+    from utils import save_screenshot
+
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, int(round(t * fps)))
+    ret, frame = cap.read()
+    cap.release()
+    return save_screenshot(frame, tag, screenshots_dir) if ret else None
+
+
+def submit_file(path, executor, chunk_seconds, stride):
+    """Queue every chunk of a recording on the pool; returns (fps, frame count, chunk futures)."""
+    fps, count = probe(path)
+    chunk = max(int(chunk_seconds * fps), 1)
+    bounds = [(s, min(s + chunk, count)) for s in range(0, count, chunk)]
+    return fps, count, [executor.submit(_analyse_chunk, path, s, e, fps, stride) for s, e in bounds]
+
+
+def score_file(path, fps, count, futures, student_id=None, exam_name=None, start_time=None, screenshots=True):
+    """Score a submitted recording; returns (violation rows, frames analysed, duration in seconds)."""
+    from scoring import FrameScorer
+
+    student_id = student_id or os.path.splitext(os.path.basename(path))[0]
+    exam_name = exam_name or config.EXAM_NAME
+    start_time = start_time or recording_start(path, count / fps)
+
+    scorer = FrameScorer()
+    rows = []
+    warning_count = 0
+    last_alert_time = float('-inf')
+    frames = 0
+    # Chunks finish in any order but are scored in file order
+    for future in futures:
+        for t, feats, boxes, height, mouth_motion in future.result():
+            frames += 1
+            verdict = scorer.update(t, feats, boxes, frame_height=height, mouth_motion=mouth_motion)
+            if verdict.violation and t - last_alert_time > 6:
+                last_alert_time = t
+                warning_count += 1
+                tag = f"{student_id}_{verdict.violation.lower().replace(' ', '_')}"
+                rows.append({
+                    'student_id': student_id,
+                    'exam_name': exam_name,
+                    'violation': verdict.violation,
+                    'time': (start_time + datetime.timedelta(seconds=t)).strftime('%Y-%m-%d %H:%M:%S'),
+                    'warning_count': warning_count,
+                    'screenshot': save_frame(path, t, fps, tag) if screenshots else None,
+                })
+    return rows, frames, count / fps
+
+
+def analyse_file(path, executor, chunk_seconds, stride, **kwargs):
+    """Analyse one recording; returns (violation rows, frames analysed, duration in seconds)."""
+    return score_file(path, *submit_file(path, executor, chunk_seconds, stride), **kwargs)
+
+
+def write_db(rows, db_path):
+    conn = sqlite3.connect(db_path)
+    c = conn.cursor()
+    c.execute('''CREATE TABLE IF NOT EXISTS violations (
+        id INTEGER PRIMARY KEY,
+        student_id TEXT,
+        exam_name TEXT,
+        violation TEXT,
+        time TEXT,
+        warning_count INTEGER,
+        screenshot TEXT
+    )''')
+    c.executemany("INSERT INTO violations (student_id, exam_name, violation, time, warning_count, screenshot) VALUES (?, ?, ?, ?, ?, ?)",
+                  [tuple(row[f] for f in FIELDS) for row in rows])
+    conn.commit()
+    conn.close()
+
+
+def write_csv(rows, csv_path):
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run exam detection on recorded videos")
+    parser.add_argument("paths", nargs="+", help="video files or directories of them")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="detection processes")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--chunk", type=float, default=60.0, help="chunk length in seconds")
+    parser.add_argument("--stride", type=int, default=1, help="analyse every Nth frame")
+    parser.add_argument("--student-id", help="defaults to the file name")
+    parser.add_argument("--exam-name")
+    parser.add_argument("--start", help="recording start, 'YYYY-MM-DD HH:MM:SS' (default: file mtime minus length)")
+    parser.add_argument("--db", help="append violations to this SQLite database")
+    parser.add_argument("--csv", help="write violations to this CSV file")
+    parser.add_argument("--no-screenshots", action="store_true")
+    args = parser.parse_args(argv)
+
+    start_time = datetime.datetime.strptime(args.start, '%Y-%m-%d %H:%M:%S') if args.start else None
+    files = video_files(args.paths)
+    if not files:
+        print("No video files found")
+        return 1
+
+    ctx = multiprocessing.get_context(config.WORKER_START_METHOD)
+    all_rows = []
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(args.threads_per_worker,)) as executor:
+        started = time.perf_counter()
+        # Queue every file's chunks first so workers never wait for the next file
+        jobs = [(path, submit_file(path, executor, args.chunk, args.stride)) for path in files]
+        total = 0.0
+        for path, job in jobs:
+            rows, frames, duration = score_file(path, *job, student_id=args.student_id, exam_name=args.exam_name,
+                                                start_time=start_time, screenshots=not args.no_screenshots)
+            total += duration
+            print(f"{path}: {len(rows)} violation(s), {frames} frames of {duration:.0f}s video "
+                  f"(done at {time.perf_counter() - started:.1f}s)")
+            all_rows.extend(rows)
+        elapsed = time.perf_counter() - started
+        print(f"Analysed {total:.0f}s of video in {elapsed:.1f}s ({total / max(elapsed, 1e-6):.1f}x real time)")
+
+    for row in all_rows:
+        print(f"  {row['time']}  {row['student_id']}  #{row['warning_count']}  {row['violation']}")
+    if args.db:
+        write_db(all_rows, args.db)
+        print(f"Wrote {len(all_rows)} row(s) to {args.db}")
+    if args.csv:
+        write_csv(all_rows, args.csv)
+        print(f"Wrote {len(all_rows)} row(s) to {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
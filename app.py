@@ -1,351 +1,43 @@
+import time
+_import_started = time.perf_counter()
+
 from flask import Flask, request, jsonify, render_template_string, session, redirect, url_for, send_from_directory, Response
+import atexit
+import functools
 import sqlite3
 import os
-import cv2
-import time
 import threading
-import queue
+import cv2
 import numpy as np
-import mediapipe as mp
-mp_face_mesh = mp.solutions.face_mesh
-mp_hands = mp.solutions.hands
-import pyttsx3
 import config
-from utils import log_violation, save_screenshot
-from ultralytics import YOLO
-import smtplib
-import ssl
+import metrics
+from broadcast import MIMETYPE as STREAM_MIMETYPE, StreamViewer, encode_part
+from events import format_sse
+from sessions import SessionManager, valid_session_id
+from utils import reset_voice_after_fork, voice_queue_depth
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)  # Secure random secret key for sessions
 
-# Detection globals
-yolo_model = YOLO('yolov8n.pt')
-engine = pyttsx3.init()
-engine.setProperty('rate', 150)
-
-face_mesh = mp_face_mesh.FaceMesh(refine_landmarks=True, max_num_faces=1)
-
-hands = mp_hands.Hands(max_num_hands=2, min_detection_confidence=0.6, min_tracking_confidence=0.6)
-
-# Global variables for detection state
-cap = None
-detection_thread = None
-frame_queue = queue.Queue(maxsize=30)
-detection_running = False
-detection_stopped = False
-alert_message = ""
-
-# Detection state variables (similar to main.py)
-last_face_center = None
-no_face_start = None
-head_move_count = 0
-warning_count = 0
-last_sudden_move_time = 0
-last_writing_move_time = 0
-alert_count = 0
-last_alert_time = 0
-last_warning_time = 0
-malpractice_pending = False
-
-
-# Additional for web
-phone_start_time = None
-phone_shot_saved = False
-speaking_shot_saved = False
-hand_shot_saved = False
-head_turn_shot_saved = False
-last_mouth_ratio = None
-mouth_motion_counter = 0
-speaking_start_time = None
-head_turn_timestamps = []
-last_turn_direction = None
-hand_start_time = None
-hand_near_mouth = False
-popup_message = ""
-popup_end_time = 0
-exam_start_time = None
-first_frame_seen = False
-exam_ended_announced = False
-voice_queue = queue.Queue()
-
-def voice_worker():
-    while True:
-        text = voice_queue.get()
-        engine.say(text)
-        engine.runAndWait()
-        voice_queue.task_done()
-
-threading.Thread(target=voice_worker, daemon=True).start()
-
-def speak(text):
-    if voice_queue.empty():
-        voice_queue.put(text)
-
-def lip_distance_ratio(landmarks):
-    top = landmarks[13].y
-    bottom = landmarks[14].y
-    left = landmarks[78].x
-    right = landmarks[308].x
-    return abs(bottom - top) / (abs(right - left) + 1e-6)
-
-def save_violation_to_db(violation_name, warning_count, screenshot_path):
-    """Save violation record to SQLite database."""
-    try:
-        conn = sqlite3.connect('violations.db')
-        c = conn.cursor()
-        c.execute("INSERT INTO violations (student_id, exam_name, violation, time, warning_count, screenshot) VALUES (?, ?, ?, ?, ?, ?)",
-                  (config.STUDENT_ID, config.EXAM_NAME, violation_name, time.strftime('%Y-%m-%d %H:%M:%S'), warning_count, screenshot_path))
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        print(f"Error saving to DB: {e}")
-
-def send_email_alert(violation_name, warning_count):
-    """Send Gmail alert for malpractice warning."""
-    def send_email():
-        subject = f"Malpractice Warning: {violation_name}"
-        body = f"""
-Student ID: {config.STUDENT_ID}
-Exam Name: {config.EXAM_NAME}
-Violation Type: {violation_name}
-Time: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}
-Warning Count: {warning_count}
-"""
-        msg = f"Subject: {subject}\n\n{body}"
-
-        try:
-            server = smtplib.SMTP("smtp.gmail.com", 587)
-            server.starttls()
-            server.login(config.EMAIL_ADDRESS, config.EMAIL_PASSWORD)
-            server.sendmail(config.EMAIL_ADDRESS, config.AUTHORITY_EMAIL, msg)
-            server.quit()
-            print("Email sent successfully")
-        except Exception as e:
-            print(f"Failed to send email: {e}")
-
-    threading.Thread(target=send_email, daemon=True).start()
-
-def send_malpractice_email():
-    """Send Gmail alert for malpractice booking to higher authority."""
-    def send_email():
-        subject = f"URGENT: Malpractice Booked - Student {config.STUDENT_ID}"
-        body = f"""
-URGENT MALPRACTICE ALERT
-
-Student has been booked for malpractice during the exam.
-
-Details:
-- Student ID: {config.STUDENT_ID}
-- Exam Name: {config.EXAM_NAME}
-- Total Warnings: {config.MAX_WARNINGS}
-- Time of Booking: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}
-- Status: Exam Terminated
-
-All violation records have been logged and screenshots saved.
-
-Please take immediate action.
-
-Exam Surveillance Authority
-"""
-        msg = f"Subject: {subject}\n\n{body}"
-
-        try:
-            server = smtplib.SMTP("smtp.gmail.com", 587)
-            server.starttls()
-            server.login(config.EMAIL_ADDRESS, config.EMAIL_PASSWORD)
-            server.sendmail(config.EMAIL_ADDRESS, config.HIGHER_AUTHORITY_EMAIL, msg)
-            server.quit()
-            print("Malpractice booking email sent successfully")
-        except Exception as e:
-            print(f"Failed to send malpractice email: {e}")
-
-    threading.Thread(target=send_email, daemon=True).start()
-
-def detection_loop():
-    global cap, detection_running, frame_queue, warning_count, last_alert_time
-    global phone_start_time, phone_shot_saved, speaking_shot_saved
-    global hand_shot_saved, head_turn_shot_saved, last_mouth_ratio
-    global mouth_motion_counter, speaking_start_time
-    global head_turn_timestamps, last_turn_direction
-    global hand_start_time, hand_near_mouth
-    global popup_message, popup_end_time
-    global exam_start_time, first_frame_seen, exam_ended_announced
-    global detection_stopped, malpractice_pending
-    global alert_message   # 🔥 THIS IS THE FIX
-
-    try:
-        cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        if not cap.isOpened():
-            print("Camera not found in detection_loop")
-            return
-
-        EXAM_DURATION_SECONDS = config.EXAM_DURATION_MINUTES * 60
-
-        while detection_running:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            try:
-                rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                now = time.time()
-
-                # Exam timer
-                if not first_frame_seen:
-                    first_frame_seen = True
-                    exam_start_time = time.time()
-                    speak("Your exam starts now")
-
-                elapsed = int(time.time() - exam_start_time)
-
-                if elapsed >= EXAM_DURATION_SECONDS and not exam_ended_announced:
-                    speak("The exam has ended")
-                    exam_ended_announced = True
-
-                detection_enabled = warning_count < config.MAX_WARNINGS
-
-                # Phone detection
-                phone_detected = False
-                if detection_enabled:
-                    results = yolo_model(frame, conf=0.5, iou=0.5, verbose=False)
-                    for r in results:
-                        for box in r.boxes:
-                            cls = int(box.cls[0])
-                            name = yolo_model.names[cls]
-                            if name == "cell phone":
-                                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                                cv2.putText(frame, "Phone", (x1, y1-8), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                                if phone_start_time is None:
-                                    phone_start_time = now
-                                if now - phone_start_time > 1.0:
-                                    phone_detected = True
+# One detection session per student; each owns its camera, stream and counters.
+# Models load on the first /start_detection (or in the background with MODEL_WARMUP=1),
+# so dashboard-only workers never import torch or mediapipe.
+session_manager = SessionManager()
+atexit.register(session_manager.stop_all)
 
-                # Face & speak
-                speaking_detected = False
-                face_results = face_mesh.process(rgb)
+metrics.Gauge("exam_event_subscribers", "Open /events connections, per session",
+              lambda: {(sid,): sess.events.subscribers for sid, sess in list(session_manager.sessions.items())},
+              labels=("session",))
+metrics.Gauge("exam_stream_viewers", "Open /video_feed streams, per session",
+              lambda: {(sid,): sess.stream.viewers for sid, sess in list(session_manager.sessions.items())},
+              labels=("session",))
+metrics.Gauge("exam_voice_queue_depth", "Messages waiting for text-to-speech", voice_queue_depth)
+metrics.Gauge("exam_sessions_running", "Detection sessions currently running", session_manager.running_count)
 
-                if detection_enabled and face_results.multi_face_landmarks:
-                    for fl in face_results.multi_face_landmarks:
-                        ratio = lip_distance_ratio(fl.landmark)
-                        if last_mouth_ratio is None:
-                            last_mouth_ratio = ratio
-                        diff = abs(ratio - last_mouth_ratio)
-                        last_mouth_ratio = ratio
 
-                        if ratio > 0.01 and diff > 0.002:
-                            mouth_motion_counter += 1
-                        else:
-                            mouth_motion_counter = 0
-                            speaking_start_time = None
-
-                        if mouth_motion_counter > 3 and not hand_near_mouth:
-                            if speaking_start_time is None:
-                                speaking_start_time = now
-                            if now - speaking_start_time > 1.0:
-                                speaking_detected = True
-                                cv2.putText(frame, "Speaking", (10, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-
-                # Hand detection
-                hand_suspicious = False
-                hand_results = hands.process(rgb)
-                if detection_enabled and hand_results.multi_hand_landmarks and face_results.multi_face_landmarks:
-                    mouth_y = fl.landmark[13].y
-                    for hl in hand_results.multi_hand_landmarks:
-                        palm_y = hl.landmark[0].y
-                        distance = abs(palm_y - mouth_y)
-                        if distance < 0.035:
-                            hand_near_mouth = True
-                        if distance < 0.04:
-                            hand_start_time = None
-                            continue
-                        if hand_start_time is None:
-                            hand_start_time = now
-                        if now - hand_start_time > 1.0:
-                            hand_suspicious = True
-                            cv2.putText(frame, "Hand Gesture", (10, 130), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-
-                # Head turn
-                head_turn_detected = False
-                if detection_enabled and face_results.multi_face_landmarks:
-                    nose_x = fl.landmark[1].x
-                    eye_center_x = (fl.landmark[33].x + fl.landmark[263].x) / 2
-                    diff = nose_x - eye_center_x
-                    turn_direction = None
-                    if diff < -0.06:
-                        turn_direction = 'left'
-                    elif diff > 0.06:
-                        turn_direction = 'right'
-                    if turn_direction and turn_direction != last_turn_direction:
-                        head_turn_timestamps.append(now)
-                        last_turn_direction = turn_direction
-                    head_turn_timestamps = [t for t in head_turn_timestamps if now - t <= 5]
-                    if len(head_turn_timestamps) >= 4:
-                        head_turn_detected = True
-
-                # Violation
-                violation_name = None
-                if phone_detected:
-                    violation_name = "Phone Detected"
-                elif speaking_detected:
-                    violation_name = "Speaking Detected"
-                elif hand_suspicious:
-                    violation_name = "Hand Gesture Detected"
-                elif head_turn_detected:
-                    violation_name = "Head Turn Detected"
-
-                if violation_name and now - last_alert_time > 6 and detection_enabled:
-                    last_alert_time = now
-                    warning_count += 1
-                    popup_message = f"Warning {warning_count}: {violation_name}"
-                    speak(popup_message)
-                    popup_end_time = now + config.WARNING_POPUP_DURATION
-                    log_violation(popup_message)
-
-                    # Save screenshot for every warning
-                    screenshot_path = save_screenshot(frame, violation_name.lower().replace(" ", "_"))
-
-                    save_violation_to_db(violation_name, warning_count, screenshot_path)
-                    send_email_alert(violation_name, warning_count)
-
-                    if warning_count >= config.MAX_WARNINGS:
-                        malpractice_pending = True
-                        alert_message = "🚨 MALPRACTICE BOOKED! "
-
-
-                # UI
-                cv2.putText(frame, f"Student ID: {config.STUDENT_ID}", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-                cv2.putText(frame, f"Exam: {config.EXAM_NAME}", (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-                cv2.putText(frame, f"Time: {elapsed//60:02d}:{elapsed%60:02d}", (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-
-                if time.time() < popup_end_time:
-                    cv2.putText(frame, popup_message, (160, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-
-                if malpractice_pending and now >= popup_end_time:
-                    popup_message = "Malpractice Booked - Exam Terminated"
-                    speak("Malpractice detected. Exam terminated.")
-                    send_malpractice_email()
-                    popup_end_time = now + 5  # show for 5 seconds
-                    detection_stopped = True
-                    detection_running = False
-                    malpractice_pending = False
-
-                # Put frame in queue
-                if not frame_queue.full():
-                    frame_queue.put(frame)
-
-            except Exception as e:
-                print(f"Error processing frame: {e}")
-                continue
-
-    except Exception as e:
-        print(f"Error in detection loop: {e}")
-    finally:
-        if cap is not None:
-            cap.release()
+def get_session_id():
+    """Session ID from the query string, defaulting to the configured student."""
+    return request.args.get('session_id') or config.STUDENT_ID
 
 # HTML Templates
 LOGIN_HTML = """
@@ -875,7 +567,8 @@ STUDENT_HTML = """
 def live():
     if 'user' not in session:
         return redirect(url_for('index'))
-    return render_template_string(LIVE_HTML)
+    session_id = get_session_id()
+    return render_template_string(LIVE_HTML, session_id=session_id, source=request.args.get('source', '0'))
 
 LIVE_HTML = """
 <!DOCTYPE html>
@@ -975,7 +668,7 @@ LIVE_HTML = """
                         <h2 class="mb-0"><i class="fas fa-camera"></i> Live Camera Feed</h2>
                     </div>
                     <div class="card-body text-center p-4">
-                        <img src="/video_feed" class="img-fluid border rounded shadow" alt="Live Feed" style="max-height: 500px;">
+                        <img src="/video_feed?session_id={{ session_id|urlencode }}" class="img-fluid border rounded shadow" alt="Live Feed" style="max-height: 500px;">
                     </div>
                 </div>
             </div>
@@ -1006,28 +699,47 @@ LIVE_HTML = """
     </div>
     <script src="https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js"></script>
     <script>
+        const sessionQuery = '?session_id={{ session_id|urlencode }}';
         document.getElementById('startBtn').addEventListener('click', function() {
-            fetch('/start_detection').then(() => {
+            fetch('/start_detection' + sessionQuery + '&source={{ source|urlencode }}').then(() => {
                 document.getElementById('status').innerText = 'Detection running...';
             });
         });
         document.getElementById('stopBtn').addEventListener('click', function() {
-            fetch('/stop_detection').then(() => {
+            fetch('/stop_detection' + sessionQuery).then(() => {
                 document.getElementById('status').innerText = 'Detection stopped';
                 document.querySelector('img').src = '/stopped';
             });
         });
 
-        // Poll for alerts every 2 seconds
-        setInterval(function() {
-            fetch('/get_alert')
-                .then(response => response.text())
-                .then(data => {
-                    if (data) {
-                        alert(data);
-                    }
-                });
-        }, 2000);
+        // Warnings, popups and state changes are pushed to every open tab as they happen
+        const statusEl = document.getElementById('status');
+        const stateLabels = {
+            running: 'Detection running...',
+            stopped: 'Detection stopped',
+            ended: 'Detection ended',
+            exam_ended: 'The exam has ended',
+            terminated: 'Exam terminated'
+        };
+        // A run's stream ends when detection stops; reconnect at once (from the last
+        // event seen) to wait for the next run, whichever tab starts it
+        let events = null;
+        function listen(lastId) {
+            if (events) events.close();
+            events = new EventSource('/events' + sessionQuery + (lastId ? '&last_event_id=' + lastId : ''));
+            events.addEventListener('state', function(e) {
+                const data = JSON.parse(e.data);
+                statusEl.innerText = stateLabels[data.state] || data.state;
+                if (['stopped', 'ended', 'terminated'].includes(data.state)) listen(e.lastEventId);
+            });
+            events.addEventListener('popup', function(e) {
+                statusEl.innerText = JSON.parse(e.data).message;
+            });
+            events.addEventListener('malpractice', function(e) {
+                alert(JSON.parse(e.data).message);
+            });
+        }
+        listen();
     </script>
 </body>
 </html>
@@ -1035,65 +747,87 @@ LIVE_HTML = """
 
 @app.route('/start_detection')
 def start_detection():
-    global detection_running, detection_thread, warning_count, last_alert_time, phone_start_time, phone_shot_saved, speaking_shot_saved, hand_shot_saved, head_turn_shot_saved, last_mouth_ratio, mouth_motion_counter, speaking_start_time, head_turn_timestamps, last_turn_direction, hand_start_time, hand_near_mouth, popup_message, popup_end_time, exam_start_time, first_frame_seen, exam_ended_announced, detection_stopped, malpractice_pending
-    if not detection_running:
-        # Reset global variables for new session
-        warning_count = 0
-        last_alert_time = 0
-        phone_start_time = None
-        phone_shot_saved = False
-        speaking_shot_saved = False
-        hand_shot_saved = False
-        head_turn_shot_saved = False
-        last_mouth_ratio = None
-        mouth_motion_counter = 0
-        speaking_start_time = None
-        head_turn_timestamps = []
-        last_turn_direction = None
-        hand_start_time = None
-        hand_near_mouth = False
-        popup_message = ""
-        popup_end_time = 0
-        exam_start_time = None
-        first_frame_seen = False
-        exam_ended_announced = False
-        detection_stopped = False
-        malpractice_pending = False
-        detection_running = True
-        detection_thread = threading.Thread(target=detection_loop)
-        detection_thread.start()
+    if 'user' not in session:
+        return jsonify({"error": "login required"}), 401
+    session_id = get_session_id()
+    try:
+        session_manager.start(session_id, request.args.get('source', 0))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
     return '', 204
 
 @app.route('/stop_detection')
 def stop_detection():
-    global detection_running, frame_queue
-    detection_running = False
-    if detection_thread:
-        detection_thread.join()
-    # Clear the queue to prevent stuck frames
-    while not frame_queue.empty():
-        frame_queue.get()
+    if 'user' not in session:
+        return jsonify({"error": "login required"}), 401
+    session_manager.stop(get_session_id())
     return '', 204
 
-def gen_frames():
-    global detection_stopped
-    while True:
-        if detection_stopped:
-            img = np.zeros((240, 320, 3), dtype=np.uint8)
-            cv2.putText(img, "Detection Stopped", (80, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            ret, buffer = cv2.imencode('.jpg', img)
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-            time.sleep(0.1)  # Prevent flooding
-        elif not frame_queue.empty():
-            frame = frame_queue.get()
-            ret, buffer = cv2.imencode('.jpg', frame)
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-        else:
-            time.sleep(0.01)  # Wait for frames
+@app.route('/sessions')
+def list_sessions():
+    return jsonify(session_manager.status())
+
+@app.route('/inference_stats')
+def inference_stats():
+    return jsonify(session_manager.inference_stats())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@functools.lru_cache(maxsize=1)
+def stopped_part():
+    img = np.zeros((240, 320, 3), dtype=np.uint8)
+    cv2.putText(img, "Detection Stopped", (80, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    return encode_part(img)
+
+def gen_frames(session_id, viewer=None):
+    """MJPEG parts for one viewer: always the session's newest frame, never a backlog.
+
+    Blocks on the session's hub between frames instead of polling; a new
+    frame or a state change (stop, malpractice, replaced session) wakes it.
+    Frames are sized, encoded and paced to the viewer's StreamViewer settings.
+    """
+    viewer = viewer or StreamViewer()
+    keepalive = config.STREAM_KEEPALIVE_SECONDS
+    hub = None
+    seq = 0
+    part = None
+    try:
+        while True:
+            sess = session_manager.wait_for(session_id, keepalive)
+            if sess is None:
+                continue  # Session not started yet
+            if sess.stream is not hub:
+                # The session was (re)created; follow its hub
+                if hub is not None:
+                    hub.leave()
+                hub, seq, part = sess.stream, 0, None
+                hub.join()
+            state = hub.state
+            if sess.detection_stopped:
+                # Frames from before the stop are stale; show the placeholder until a restart
+                seq, part = hub.seq, stopped_part()
+                yield part
+                hub.wait(seq, state, keepalive)
+                continue
+            seq, new_part = hub.latest(seq, viewer.key)
+            if new_part is not None:
+                part = new_part
+                started = time.monotonic()
+                yield part
+                # The yield returns once the server has written the part to the socket
+                now = time.monotonic()
+                viewer.sent(now - started, now)
+                time.sleep(viewer.delay(now))  # Hold to the viewer's frame rate
+            elif not hub.wait(seq, state, keepalive) and part is not None:
+                # Nothing new for a while: resend so a closed connection gets noticed
+                yield part
+    finally:
+        if hub is not None:
+            hub.leave()
 
 @app.route('/stopped')
 def stopped():
@@ -1105,20 +839,106 @@ def stopped():
 
 @app.route('/video_feed')
 def video_feed():
-    return Response(gen_frames(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    return Response(gen_frames(get_session_id(), StreamViewer.from_args(request.args)), mimetype=STREAM_MIMETYPE)
+
+def gen_events(session_id, last_id):
+    """text/event-stream of a session's events after last_id, pushed as they are published.
+
+    Waits (with keepalives) for a session that hasn't started yet or is
+    stopped; ends with a retry hint when the run it followed stops, so the
+    client reconnects and waits for the next run.
+    """
+    keepalive = config.EVENT_KEEPALIVE_SECONDS
+    yield ": connected\n\n"
+    log = session_manager.events(session_id)
+    if log is not None and last_id is None:
+        last_id = log.seq  # A new connection starts from now
+    while log is None:
+        log = session_manager.wait_events(session_id, keepalive)
+        if log is None:
+            yield ": keepalive\n\n"
+        elif last_id is None:
+            last_id = log.first_id  # Everything from the run we waited for
+    log.subscribe()
+    try:
+        while True:
+            events = log.since(last_id, keepalive)
+            if not events and log.closed:
+                yield f"retry: {config.EVENT_RETRY_MS}\n\n"
+                return
+            if not events:
+                # Comment line: keeps proxies from timing out and notices closed connections
+                yield ": keepalive\n\n"
+                continue
+            for event in events:
+                yield format_sse(event)
+            last_id = events[-1].id
+    finally:
+        log.unsubscribe()
+
+@app.route('/events')
+def event_stream():
+    """Server-Sent Events for one session: warning, popup, malpractice and state events.
+
+    A reconnecting EventSource sends Last-Event-ID and gets what it missed;
+    a new connection starts from now unless ?last_event_id= asks for the backlog.
+    The stream stays open before the session starts and between runs; only
+    an ID that can't be valid gets a 204, which tells EventSource to give up.
+    """
+    session_id = get_session_id()
+    if not valid_session_id(session_id):
+        return '', 204
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_id = int(last_id) if last_id is not None else None
+    except ValueError:
+        last_id = None
+    return Response(gen_events(session_id, last_id), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
+# Superseded by /events for the live page; kept for clients that still poll
 @app.route('/get_alert')
 def get_alert():
-    global alert_message
-    msg = alert_message
-    alert_message = ""
-    return msg
+    sess = session_manager.get(get_session_id())
+    return sess.pop_alert() if sess is not None else ''
 
 @app.route('/logout')
 def logout():
     session.pop('user', None)
     return redirect(url_for('index'))
 
+metrics.Gauge("exam_process_memory_mb", "This worker's memory from /proc (rss, pss, shared)",
+              lambda: {(kind,): mb for kind, mb in metrics.process_memory().items()}, labels=("kind",))
+
+
+def after_fork():
+    """Called by gunicorn's post_fork hook in each worker of a preloaded app."""
+    session_manager.after_fork()
+    reset_voice_after_fork()
+    metrics.reset_after_fork()
+    if config.MODEL_WARMUP:
+        threading.Thread(target=session_manager.warm_up, name="model-warm-up", daemon=True).start()
+
+
+@app.route('/memory')
+def memory():
+    return jsonify({'pid': os.getpid(), **metrics.process_memory()})
+
+
+startup_seconds = time.perf_counter() - _import_started
+metrics.Gauge("exam_startup_seconds", "Time to import the app, models excluded", lambda: startup_seconds)
+if startup_seconds > config.STARTUP_BUDGET_SECONDS:
+    print(f"Warning: app startup took {startup_seconds:.2f}s (budget {config.STARTUP_BUDGET_SECONDS}s)")
+
+# Only in the serving process: a model worker spawned under `python app.py` re-imports
+# this module as __mp_main__ and must not preload or start a pool of its own
+if __name__ != '__mp_main__':
+    if config.PRELOAD_MODELS:
+        # Under 'gunicorn --preload' this runs once in the master and workers share the pages
+        session_manager.preload()
+    elif config.MODEL_WARMUP:
+        threading.Thread(target=session_manager.warm_up, name="model-warm-up", daemon=True).start()
+
 if __name__ == '__main__':
     try:
         print("Starting Exam Surveillance Web App...")
@@ -9,6 +9,8 @@ import sqlite3
 import os
 import time
 
+import metrics
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
@@ -64,6 +66,20 @@ def get_records_from_db():
         })
     return records
 
+
+def count_violations_by_type():
+    """Stored violation rows per violation type, read at scrape time."""
+    conn = sqlite3.connect(get_db_path())
+    c = conn.cursor()
+    c.execute("SELECT violation, COUNT(*) FROM violations GROUP BY violation")
+    rows = c.fetchall()
+    conn.close()
+    return {(violation,): count for violation, count in rows}
+
+
+metrics.Gauge("exam_violations_stored", "Violation records in the database, per type",
+              count_violations_by_type, labels=("violation",))
+
 # HTML Templates
 LOGIN_HTML = """
 <!DOCTYPE html>
@@ -606,6 +622,10 @@ def health():
     """Health check endpoint for Render"""
     return jsonify({"status": "healthy", "mode": "cloud-dashboard"})
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
 # For local development
 if __name__ == '__main__':
     print("Starting Exam Surveillance Cloud Dashboard...")
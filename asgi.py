@@ -0,0 +1,199 @@
+"""
+ASGI entry point: streaming routes as coroutines, everything else through Flask.
+
+Under sync gunicorn workers every open /video_feed or /events connection
+holds a worker (or thread) for as long as it stays open, so a few
+proctors watching streams starve /dashboard. Here those two routes run
+as coroutines on the event loop, waiting on the session's FrameHub and
+EventLog without a thread each, and can hold hundreds of connections.
+All other routes go to the unchanged Flask app on a small thread pool
+(a2wsgi), and detection keeps running on its own threads and processes.
+
+Run with:
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+    gunicorn asgi:app      (gunicorn.conf.py picks the uvicorn worker)
+
+Needs uvicorn and a2wsgi (see requirements-local.txt).
+"""
+
+import asyncio
+import os
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+
+import config
+from app import app as flask_app, session_manager, stopped_part
+from broadcast import MIMETYPE as STREAM_MIMETYPE, StreamViewer
+from events import format_sse
+from sessions import valid_session_id
+
+wsgi = WSGIMiddleware(flask_app, workers=config.ASGI_WSGI_THREADS)
+
+
+def query_param(scope, name):
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get(name)
+    return values[0] if values else None
+
+
+def header(scope, name):
+    for key, value in scope.get('headers', ()):
+        if key.decode('latin-1').lower() == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def start_response(send, content_type, extra=()):
+    headers = [(b'content-type', content_type.encode()), (b'cache-control', b'no-cache')]
+    headers.extend((k.encode(), v.encode()) for k, v in extra)
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+
+async def until_disconnect(receive, body):
+    """Run the body coroutine until it returns or the client disconnects, then cancel the other."""
+    async def watch():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    body_task = asyncio.ensure_future(body)
+    watcher = asyncio.ensure_future(watch())
+    done, pending = await asyncio.wait({body_task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    if body_task in done:
+        body_task.result()
+
+
+async def video_feed(scope, receive, send):
+    """Coroutine version of app.gen_frames."""
+    session_id = query_param(scope, 'session_id') or config.STUDENT_ID
+    viewer = StreamViewer.from_args({name: query_param(scope, name) for name in ('fps', 'width', 'quality')})
+    keepalive = config.STREAM_KEEPALIVE_SECONDS
+    loop = asyncio.get_running_loop()
+    await start_response(send, STREAM_MIMETYPE)
+
+    async def write(part):
+        await send({'type': 'http.response.body', 'body': part, 'more_body': True})
+
+    async def body():
+        hub = None
+        seq = 0
+        part = None
+        try:
+            while True:
+                sess = await session_manager.wait_for_async(session_id, keepalive)
+                if sess is None:
+                    continue  # Session not started yet
+                if sess.stream is not hub:
+                    if hub is not None:
+                        hub.leave()
+                    hub, seq, part = sess.stream, 0, None
+                    hub.join()
+                state = hub.state
+                if sess.detection_stopped:
+                    seq, part = hub.seq, stopped_part()
+                    await write(part)
+                    await hub.wait_async(seq, state, keepalive)
+                    continue
+                # Other viewers usually encoded the frame already; only encode off the loop
+                seq, new_part = hub.cached(seq, viewer.key)
+                if new_part is None:
+                    seq, new_part = await asyncio.to_thread(hub.latest, seq, viewer.key)
+                if new_part is not None:
+                    part = new_part
+                    started = loop.time()
+                    # send() waits for the transport to drain, so this times the client's link
+                    await write(part)
+                    now = loop.time()
+                    viewer.sent(now - started, now)
+                    await asyncio.sleep(viewer.delay(now))
+                elif not await hub.wait_async(seq, state, keepalive) and part is not None:
+                    await write(part)
+        finally:
+            if hub is not None:
+                hub.leave()
+
+    await until_disconnect(receive, body())
+
+
+async def event_stream(scope, receive, send):
+    """Coroutine version of app.gen_events."""
+    session_id = query_param(scope, 'session_id') or config.STUDENT_ID
+    if not valid_session_id(session_id):
+        await send({'type': 'http.response.start', 'status': 204, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    last_id = header(scope, 'last-event-id') or query_param(scope, 'last_event_id')
+    try:
+        last_id = int(last_id) if last_id is not None else None
+    except ValueError:
+        last_id = None
+    keepalive = config.EVENT_KEEPALIVE_SECONDS
+    await start_response(send, 'text/event-stream', [('x-accel-buffering', 'no')])
+
+    async def write(text):
+        await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+
+    async def body():
+        nonlocal last_id
+        await write(": connected\n\n")
+        log = session_manager.events(session_id)
+        if log is not None and last_id is None:
+            last_id = log.seq
+        while log is None:
+            log = await session_manager.wait_events_async(session_id, keepalive)
+            if log is None:
+                await write(": keepalive\n\n")
+            elif last_id is None:
+                last_id = log.first_id
+        log.subscribe()
+        try:
+            while True:
+                events = await log.since_async(last_id, keepalive)
+                if not events and log.closed:
+                    await send({'type': 'http.response.body', 'body': f"retry: {config.EVENT_RETRY_MS}\n\n".encode()})
+                    return
+                if not events:
+                    await write(": keepalive\n\n")
+                    continue
+                await write("".join(format_sse(event) for event in events))
+                last_id = events[-1].id
+        finally:
+            log.unsubscribe()
+
+    await until_disconnect(receive, body())
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.to_thread(session_manager.stop_all)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+STREAM_ROUTES = {
+    '/video_feed': video_feed,
+    '/events': event_stream,
+}
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    route = STREAM_ROUTES.get(scope.get('path')) if scope['type'] == 'http' else None
+    if route is not None and scope.get('method') == 'GET':
+        await route(scope, receive, send)
+    else:
+        await wsgi(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
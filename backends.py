@@ -0,0 +1,226 @@
+"""
+Phone detector inference backends.
+
+config.YOLO_BACKEND picks how the YOLO model runs:
+
+    torch           the original PyTorch eager model (YOLO_MODEL_PATH)
+    onnx            exported ONNX model run by ONNX Runtime
+    onnx-int8       ONNX model statically quantized to INT8 on calibration frames
+    openvino        exported OpenVINO IR
+    openvino-int8   OpenVINO IR quantized to INT8 by ultralytics/NNCF
+
+Every backend is loaded through ultralytics' YOLO class, so the detection
+loops get the same Results/boxes structure whichever one is selected.
+
+Usage:
+    python backends.py export --backend onnx
+    python backends.py export --backend onnx-int8 --calibration exam_clip.mp4
+    python backends.py check --backend onnx-int8 --clip exam_clip.mp4
+"""
+
+import argparse
+import os
+import shutil
+import sys
+
+import config
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino", "openvino-int8")
+
+
+def backend_path(backend):
+    """File or directory the given backend loads its model from."""
+    base, _ = os.path.splitext(config.YOLO_MODEL_PATH)
+    return {
+        "torch": config.YOLO_MODEL_PATH,
+        "onnx": f"{base}.onnx",
+        "onnx-int8": f"{base}-int8.onnx",
+        "openvino": f"{base}_openvino_model",
+        "openvino-int8": f"{base}_int8_openvino_model",
+    }[backend]
+
+
+def load_yolo(backend=None):
+    """Load the phone detector for the configured backend."""
+    from ultralytics import YOLO
+
+    backend = backend or config.YOLO_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown YOLO backend {backend!r}; choose one of {', '.join(BACKENDS)}")
+    path = backend_path(backend)
+    if backend != "torch" and not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found; run 'python backends.py export --backend {backend}' first")
+    print(f"Loading YOLO backend '{backend}' from {path}")
+    return YOLO(path, task="detect")
+
+
+def read_clip_frames(path, every_n=1, limit=None):
+    """Yield BGR frames from a video file, keeping every Nth one."""
+    import cv2
+
+    cap = cv2.VideoCapture(path)
+    index = kept = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % every_n == 0:
+                yield frame
+                kept += 1
+                if limit and kept >= limit:
+                    break
+            index += 1
+    finally:
+        cap.release()
+
+
+def _letterbox(frame, size):
+    """Resize with padding to a size x size NCHW float32 tensor, as YOLO expects."""
+    import cv2
+    import numpy as np
+
+    h, w = frame.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas[top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh))
+    rgb = canvas[:, :, ::-1].transpose(2, 0, 1)
+    return np.ascontiguousarray(rgb, dtype=np.float32)[None] / 255.0
+
+
+def quantize_onnx(fp32_path, int8_path, calibration_clip, imgsz=640, frames=200):
+    """Statically quantize an ONNX model to INT8 using frames from a recorded clip."""
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class ClipReader(CalibrationDataReader):
+        def __init__(self):
+            self.frames = read_clip_frames(calibration_clip, every_n=5, limit=frames)
+
+        def get_next(self):
+            frame = next(self.frames, None)
+            return None if frame is None else {input_name: _letterbox(frame, imgsz)}
+
+    quantize_static(fp32_path, int8_path, ClipReader(),
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=True)
+
+
+def export(backend, calibration=None, data=None, imgsz=640):
+    """Export YOLO_MODEL_PATH for a backend and return the resulting path."""
+    from ultralytics import YOLO
+
+    if backend == "torch":
+        return config.YOLO_MODEL_PATH
+    target = backend_path(backend)
+    model = YOLO(config.YOLO_MODEL_PATH)
+
+    if backend in ("onnx", "onnx-int8"):
+        # Dynamic axes so batched calls and small ROI crops both work
+        exported = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if backend == "onnx":
+            if os.path.abspath(exported) != os.path.abspath(target):
+                shutil.move(exported, target)
+            return target
+        if not calibration:
+            raise ValueError("onnx-int8 needs --calibration <video clip>")
+        quantize_onnx(exported, target, calibration, imgsz=imgsz)
+        return target
+
+    # OpenVINO; INT8 calibration is done by ultralytics/NNCF on a dataset yaml
+    kwargs = {"int8": True, "data": data or "coco128.yaml"} if backend == "openvino-int8" else {}
+    exported = model.export(format="openvino", imgsz=imgsz, **kwargs)
+    if os.path.abspath(exported) != os.path.abspath(target):
+        if os.path.exists(target):
+            shutil.rmtree(target)
+        shutil.move(exported, target)
+    return target
+
+
+def _iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(ix2 - ix1, 0) * max(iy2 - iy1, 0)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def check(backend, clip, tolerance=None, every_n=5, conf=0.5, iou=0.5):
+    """Compare a backend's phone detections with the torch model on a fixed clip.
+
+    Returns (passed, report). Detections match when their IoU is at least
+    0.5; the check passes when both recall and precision against the torch
+    reference are within tolerance of 1.0.
+    """
+    from phone_detector import phone_boxes
+
+    tolerance = config.BACKEND_CHECK_TOLERANCE if tolerance is None else tolerance
+    reference = load_yolo("torch")
+    candidate = load_yolo(backend)
+
+    ref_total = cand_total = matched = frames = 0
+    for frame in read_clip_frames(clip, every_n=every_n):
+        frames += 1
+        ref = [b for r in reference(frame, conf=conf, iou=iou, verbose=False) for b in phone_boxes(r, reference.names)]
+        cand = [b for r in candidate(frame, conf=conf, iou=iou, verbose=False) for b in phone_boxes(r, candidate.names)]
+        ref_total += len(ref)
+        cand_total += len(cand)
+        unused = list(cand)
+        for box in ref:
+            best = max(unused, key=lambda c: _iou(box, c), default=None)
+            if best is not None and _iou(box, best) >= 0.5:
+                matched += 1
+                unused.remove(best)
+
+    recall = matched / ref_total if ref_total else 1.0
+    precision = matched / cand_total if cand_total else 1.0
+    passed = recall >= 1.0 - tolerance and precision >= 1.0 - tolerance
+    report = {
+        "backend": backend,
+        "frames": frames,
+        "reference_boxes": ref_total,
+        "candidate_boxes": cand_total,
+        "recall": round(recall, 4),
+        "precision": round(precision, 4),
+        "tolerance": tolerance,
+        "passed": passed,
+    }
+    return passed, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and verify phone detector backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="export YOLO_MODEL_PATH for a backend")
+    p_export.add_argument("--backend", choices=BACKENDS, default=config.YOLO_BACKEND)
+    p_export.add_argument("--calibration", help="video clip used to calibrate onnx-int8")
+    p_export.add_argument("--data", help="dataset yaml used to calibrate openvino-int8")
+    p_export.add_argument("--imgsz", type=int, default=640)
+
+    p_check = sub.add_parser("check", help="compare a backend with the torch model on a clip")
+    p_check.add_argument("--backend", choices=BACKENDS, default=config.YOLO_BACKEND)
+    p_check.add_argument("--clip", required=True)
+    p_check.add_argument("--tolerance", type=float, default=None)
+    p_check.add_argument("--every", type=int, default=5, help="use every Nth frame")
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        path = export(args.backend, calibration=args.calibration, data=args.data, imgsz=args.imgsz)
+        print(f"Exported '{args.backend}' backend to {path}")
+        return 0
+
+    passed, report = check(args.backend, args.clip, tolerance=args.tolerance, every_n=args.every)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""
+Record-and-replay benchmark for the detection pipeline.
+
+Replays fixed video fixtures frame by frame through the same
+DetectionSession.process_frame() that detection_loop runs, with the
+configured backend, cascade and cadence settings, then publishes and
+JPEG-encodes each frame through the session's stream hub as /video_feed
+does. Every frame is processed (nothing is dropped) and the clock is the
+video's own timeline, so runs are repeatable.
+
+Reports per fixture: frames per second, p50/p95/p99 per-frame latency,
+the mean of each stage (capture, gate, cvtColor, yolo, facemesh, hands, mouth, rules,
+overlay, jpeg) and the process's peak RSS. Results are written as JSON;
+compare them with a stored baseline to catch regressions before deploy.
+
+The startup command imports a web app in a fresh interpreter and checks
+it against config.STARTUP_BUDGET_SECONDS and that no model framework
+(torch, ultralytics, mediapipe) was imported along the way.
+
+Usage:
+    python bench.py record --source 0 --seconds 30 --out bench_fixtures/desk.avi
+    python bench.py run bench_fixtures/ --out bench_results.json
+    python bench.py run bench_fixtures/ --baseline bench_baseline.json --tolerance 0.1
+    python bench.py startup --app app
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import config
+from utils import video_files
+
+FIXTURES_DIR = "bench_fixtures"
+# Pipeline stage names as reported by the benchmark
+STAGE_NAMES = {'face': 'facemesh', 'hands': 'hands', 'phone': 'yolo', 'landmarks': 'landmarks'}
+# Modules the dashboard must be able to serve without
+MODEL_MODULES = ('torch', 'ultralytics', 'mediapipe')
+# Metrics where a larger value is a regression; fps is the other way round
+LOWER_IS_BETTER = ('p50_ms', 'p95_ms', 'p99_ms', 'peak_rss_mb')
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / 2**20, 1)
+        except (ImportError, AttributeError):
+            return None
+    kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return round(kb / 2**20 if sys.platform == "darwin" else kb / 2**10, 1)
+
+
+def record(source, seconds, out):
+    """Record a fixture from a camera or stream."""
+    from sessions import parse_source
+
+    cap = cv2.VideoCapture(parse_source(source))
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open source {source!r}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    writer = None
+    frames = 0
+    deadline = time.time() + seconds
+    try:
+        while time.time() < deadline:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if writer is None:
+                h, w = frame.shape[:2]
+                writer = cv2.VideoWriter(out, cv2.VideoWriter_fourcc(*"MJPG"), fps, (w, h))
+            writer.write(frame)
+            frames += 1
+    finally:
+        cap.release()
+        if writer is not None:
+            writer.release()
+    print(f"Recorded {frames} frames to {out}")
+
+
+def replay(path, yolo_model, warmup=10, limit=None):
+    """Run one fixture through the detection pipeline and return its results."""
+    from sessions import DetectionSession
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open {path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    session = DetectionSession(f"bench-{os.path.basename(path)}", source=path, yolo_model=yolo_model, dry_run=True)
+    face_mesh, hands = session.open_models()
+    pipeline = session.build_pipeline(face_mesh, hands)
+
+    latencies = []
+    stages = {}
+    index = 0
+    started = None
+    try:
+        while limit is None or index < warmup + limit:
+            t0 = time.perf_counter()
+            ret, frame = cap.read()
+            capture_ms = (time.perf_counter() - t0) * 1000
+            if not ret:
+                break
+            if index == warmup:
+                started = time.perf_counter()
+
+            frame = session.process_frame(pipeline, frame, index / fps)
+            t1 = time.perf_counter()
+            session.stream.publish(frame)
+            session.stream.latest()
+            jpeg_ms = (time.perf_counter() - t1) * 1000
+            total_ms = (time.perf_counter() - t0) * 1000
+
+            if index >= warmup:
+                latencies.append(total_ms)
+                timings = dict(session.last_timings, capture=capture_ms, jpeg=jpeg_ms)
+                timings.pop('wall', None)
+                for name, ms in timings.items():
+                    stages.setdefault(STAGE_NAMES.get(name, name), []).append(ms)
+            index += 1
+        elapsed = time.perf_counter() - started if started is not None else 0.0
+    finally:
+        pipeline.close()
+        cap.release()
+        session.close_models(face_mesh, hands)
+
+    if not latencies:
+        raise ValueError(f"{path} has no frames after {warmup} warm-up frames")
+    lat = np.array(latencies)
+    return {
+        'frames': len(latencies),
+        'fps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'mean_ms': round(float(lat.mean()), 2),
+        'p50_ms': round(float(np.percentile(lat, 50)), 2),
+        'p95_ms': round(float(np.percentile(lat, 95)), 2),
+        'p99_ms': round(float(np.percentile(lat, 99)), 2),
+        # Stages that are sometimes skipped average over the frames they ran on
+        'stages_ms': {name: round(float(np.mean(v)), 3) for name, v in sorted(stages.items())},
+        'stage_runs': {name: len(v) for name, v in sorted(stages.items())},
+        'violations': session.violations_booked,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """List regressions of more than `tolerance` (a fraction) against a baseline."""
+    regressions = []
+    for name, current in results['fixtures'].items():
+        ref = baseline.get('fixtures', {}).get(name)
+        if ref is None:
+            continue
+        for metric in ('fps',) + LOWER_IS_BETTER:
+            new, old = current.get(metric), ref.get(metric)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            worse = change < -tolerance if metric == 'fps' else change > tolerance
+            if worse:
+                regressions.append(f"{name}: {metric} {old} -> {new} ({change:+.1%})")
+        for stage, new in current.get('stages_ms', {}).items():
+            old = ref.get('stages_ms', {}).get(stage)
+            # Ignore sub-millisecond stages; their noise dwarfs any real change
+            if old and max(new, old) >= 1.0 and (new - old) / old > tolerance:
+                regressions.append(f"{name}: stage {stage} {old} -> {new} ms ({(new - old) / old:+.1%})")
+    return regressions
+
+
+def run(paths, out, baseline=None, tolerance=0.1, warmup=10, limit=None):
+    from backends import load_yolo
+
+    files = video_files(paths)
+    if not files:
+        print(f"No fixtures found; record one with: python bench.py record --out {FIXTURES_DIR}/desk.avi")
+        return 1
+
+    yolo_model = load_yolo()
+    results = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'yolo_backend': config.YOLO_BACKEND,
+            'yolo_every_n_frames': config.YOLO_EVERY_N_FRAMES,
+            'cascade_gating': config.CASCADE_GATING,
+            'phone_roi_mode': config.PHONE_ROI_MODE,
+            'motion_gate': config.MOTION_GATE,
+        },
+        'fixtures': {},
+    }
+    for path in files:
+        name = os.path.basename(path)
+        result = replay(path, yolo_model, warmup=warmup, limit=limit)
+        results['fixtures'][name] = result
+        stages = ", ".join(f"{k} {v}" for k, v in result['stages_ms'].items())
+        print(f"{name}: {result['fps']} fps, p50 {result['p50_ms']} / p95 {result['p95_ms']} / "
+              f"p99 {result['p99_ms']} ms, peak RSS {result['peak_rss_mb']} MB")
+        print(f"  stages (ms): {stages}")
+
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"Wrote {out}")
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), tolerance)
+        if regressions:
+            print(f"Regressions against {baseline} (tolerance {tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {baseline}")
+    return 0
+
+
+def startup(module="app", runs=3):
+    """Time importing a web app module in fresh interpreters; returns (passed, report)."""
+    probe = ("import json, sys, time; t = time.perf_counter(); import {module}; "
+             "print(json.dumps([time.perf_counter() - t, [m for m in {models!r} if m in sys.modules]]))")
+    code = probe.format(module=module, models=MODEL_MODULES)
+    env = dict(os.environ, MODEL_WARMUP="0")
+    times, loaded = [], set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        if out.returncode != 0:
+            raise RuntimeError(f"importing {module} failed:\n{out.stderr}")
+        seconds, modules = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(seconds)
+        loaded.update(modules)
+    best = min(times)
+    passed = best <= config.STARTUP_BUDGET_SECONDS and not loaded
+    report = {
+        'module': module,
+        'import_seconds': round(best, 3),
+        'budget_seconds': config.STARTUP_BUDGET_SECONDS,
+        'model_modules_imported': sorted(loaded),
+        'passed': passed,
+    }
+    return passed, report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the detection pipeline on recorded fixtures")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_record = sub.add_parser("record", help="record a fixture from a camera or stream")
+    p_record.add_argument("--source", default="0")
+    p_record.add_argument("--seconds", type=float, default=30.0)
+    p_record.add_argument("--out", required=True)
+
+    p_run = sub.add_parser("run", help="replay fixtures and report throughput")
+    p_run.add_argument("paths", nargs="*", default=[FIXTURES_DIR], help="fixture files or directories")
+    p_run.add_argument("--out", default="bench_results.json")
+    p_run.add_argument("--baseline", help="results JSON to compare against; exit 1 on regression")
+    p_run.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown as a fraction")
+    p_run.add_argument("--warmup", type=int, default=10, help="frames excluded from the stats")
+    p_run.add_argument("--frames", type=int, help="stop after this many measured frames")
+
+    p_startup = sub.add_parser("startup", help="check a web app's import time and that it loads no models")
+    p_startup.add_argument("--app", default="app", help="module to import (app or app_cloud)")
+    p_startup.add_argument("--runs", type=int, default=3, help="best of this many fresh imports")
+
+    args = parser.parse_args(argv)
+    if args.command == "startup":
+        passed, report = startup(args.app, args.runs)
+        for key, value in report.items():
+            print(f"{key}: {value}")
+        return 0 if passed else 1
+    if args.command == "record":
+        record(args.source, args.seconds, args.out)
+        return 0
+    return run(args.paths, args.out, baseline=args.baseline, tolerance=args.tolerance,
+               warmup=args.warmup, limit=args.frames)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Single-encode broadcast of a session's annotated frames.
+
+FrameHub holds the latest frame under a sequence number and encodes it
+once per (width, quality) setting, sharing the bytes among viewers.
+Viewers wait() (or wait_async()) for a newer frame and skip stale ones.
+Each viewer's StreamViewer sets its frame rate, width and JPEG quality
+from query parameters or steps along STREAM_LADDER by socket write time.
+"""
+
+import threading
+import time
+
+import cv2
+
+import config
+import metrics
+from aio import Waiters, wait_for
+
+BOUNDARY = b"frame"
+# An encode for a setting this many frames old is dropped
+STALE_ENCODE_FRAMES = 300
+MIMETYPE = "multipart/x-mixed-replace; boundary=" + BOUNDARY.decode()
+
+
+def multipart(jpeg):
+    """One part of the MJPEG multipart stream."""
+    return b"--" + BOUNDARY + b"\r\nContent-Type: image/jpeg\r\n\r\n" + jpeg + b"\r\n"
+
+
+def encode_part(frame, width=None, quality=None):
+    """Multipart JPEG of `frame`, scaled down to at most `width` pixels wide."""
+    if width and frame.shape[1] > width:
+        height = round(frame.shape[0] * width / frame.shape[1])
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if quality else []
+    ok, buffer = cv2.imencode('.jpg', frame, params)
+    if not ok:
+        raise ValueError("JPEG encoding failed")
+    return multipart(buffer.tobytes())
+
+
+def _int_arg(args, name):
+    try:
+        return int(args.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class StreamViewer:
+    """One /video_feed client's frame rate, width and JPEG quality.
+
+    Given any of fps, width (0 = full size) or quality the settings are fixed;
+    with none, the viewer starts at the top of STREAM_LADDER and steps down
+    when writing a frame takes more than STREAM_SLOW_BUSY of the frame
+    interval, and back up after STREAM_UPGRADE_SECONDS under STREAM_FAST_BUSY.
+    """
+
+    def __init__(self, fps=None, width=None, quality=None):
+        self.adaptive = fps is None and width is None and quality is None
+        self.rung = 0
+        top_width, top_quality, top_fps = config.STREAM_LADDER[0]
+        self.fps = top_fps if fps is None else min(max(fps, 1), config.STREAM_MAX_FPS)
+        # Snap to coarse steps so viewers asking for similar settings share encodes
+        if width is None:
+            self.width = top_width
+        else:
+            self.width = None if width <= 0 else min(max(width // 16 * 16, 80), 1920)
+        self.quality = top_quality if quality is None else min(max(quality // 5 * 5, 10), 95)
+        self.busy = 0.0
+        self.changed_at = time.monotonic()
+        self.next_due = 0.0
+
+    @classmethod
+    def from_args(cls, args):
+        """From a query-string mapping (request.args or parse_qs output flattened)."""
+        return cls(_int_arg(args, 'fps'), _int_arg(args, 'width'), _int_arg(args, 'quality'))
+
+    @property
+    def key(self):
+        return self.width, self.quality
+
+    def delay(self, now):
+        """Seconds to wait before this viewer may be sent another frame."""
+        return max(self.next_due - now, 0.0)
+
+    def sent(self, write_seconds, now):
+        """Record how long writing a frame took, and adapt the settings if allowed."""
+        interval = 1.0 / self.fps
+        self.next_due = now + interval - min(write_seconds, interval)
+        if not self.adaptive:
+            return
+        self.busy = 0.8 * self.busy + 0.2 * min(write_seconds / interval, 1.0)
+        held = now - self.changed_at
+        if self.busy > config.STREAM_SLOW_BUSY and held >= 1.0 and self.rung < len(config.STREAM_LADDER) - 1:
+            self._set_rung(self.rung + 1, now)
+        elif self.busy < config.STREAM_FAST_BUSY and held >= config.STREAM_UPGRADE_SECONDS and self.rung > 0:
+            self._set_rung(self.rung - 1, now)
+
+    def _set_rung(self, rung, now):
+        metrics.STREAM_QUALITY_CHANGES.inc(direction="down" if rung > self.rung else "up")
+        self.rung = rung
+        self.width, self.quality, self.fps = config.STREAM_LADDER[rung]
+        self.busy = 0.0
+        self.changed_at = now
+
+
+class FrameHub:
+    """Latest annotated frame of one session, JPEG-encoded at most once for all viewers."""
+
+    def __init__(self, name=""):
+        self.name = name
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.waiters = Waiters()
+        # Encoding runs outside self.lock so publish() never waits for a viewer
+        self.encode_lock = threading.Lock()
+        self.frame = None
+        self.seq = 0
+        self.state = 0           # bumped by notify() on session state changes
+        self.encoded = {}        # (width, quality) -> (seq, multipart bytes) of its newest encode
+        self.viewers = 0
+        self.frames_published = 0
+        self.encodes = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+    def publish(self, frame):
+        """Make `frame` the latest; the caller must not modify it afterwards."""
+        with self.cond:
+            self.frame = frame
+            self.seq += 1
+            self.frames_published += 1
+            self.cond.notify_all()
+            self.waiters.wake_all()
+
+    def notify(self):
+        """Wake every waiting viewer so it re-checks the session (stopped, ended, replaced)."""
+        with self.cond:
+            self.state += 1
+            self.cond.notify_all()
+            self.waiters.wake_all()
+
+    def wait(self, after, state, timeout=None):
+        """Block until a frame newer than `after` exists or the state moves past `state`.
+
+        Returns False if the timeout passed first.
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: self.seq > after or self.state != state, timeout)
+
+    async def wait_async(self, after, state, timeout=None):
+        """wait() for coroutines."""
+        return await wait_for(self.lock, self.waiters, lambda: self.seq > after or self.state != state, timeout)
+
+    def latest(self, after=0, key=(None, None)):
+        """(seq, part) of the newest frame if it is newer than `after`, else (after, None).
+
+        key is a StreamViewer's (width, quality); (None, None) is full size at
+        OpenCV's default quality.
+        """
+        with self.lock:
+            seq, frame = self.seq, self.frame
+        if frame is None or seq <= after:
+            return after, None
+        with self.encode_lock:
+            encoded = self.encoded.get(key)
+            if encoded is None or encoded[0] < seq:
+                encoded = self.encoded[key] = (seq, encode_part(frame, *key))
+                self.encodes += 1
+                metrics.STREAM_ENCODES.inc()
+                # Forget settings nobody has asked for in a while
+                for other in [k for k, (s, _) in self.encoded.items() if s < seq - STALE_ENCODE_FRAMES]:
+                    del self.encoded[other]
+        return self._sent(encoded, after)
+
+    def cached(self, after=0, key=(None, None)):
+        """Like latest() but never encodes or waits: (after, None) unless the newest frame is already encoded."""
+        encoded = self.encoded.get(key)
+        if encoded is None or encoded[0] <= after or encoded[0] < self.seq:
+            return after, None
+        return self._sent(encoded, after)
+
+    def _sent(self, encoded, after):
+        seq, part = encoded
+        skipped = seq - after - 1 if after else 0
+        with self.lock:
+            self.frames_sent += 1
+            self.frames_skipped += skipped
+        metrics.STREAM_FRAMES_SENT.inc()
+        if skipped:
+            metrics.STREAM_FRAMES_SKIPPED.inc(skipped)
+        return seq, part
+
+    def join(self):
+        with self.lock:
+            self.viewers += 1
+
+    def leave(self):
+        with self.lock:
+            self.viewers -= 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'viewers': self.viewers,
+                'frames_published': self.frames_published,
+                'encodes': self.encodes,
+                'settings': len(self.encoded),
+                'frames_sent': self.frames_sent,
+                'frames_skipped': self.frames_skipped,
+            }
@@ -0,0 +1,92 @@
+"""
+Background frame capture.
+
+FrameGrabber reads a cv2.VideoCapture on its own thread and keeps only
+the newest frame, stamped with time.monotonic() as it is read.
+"""
+
+import threading
+import time
+
+import cv2
+
+import metrics
+
+
+class FrameGrabber:
+    """Continuously read frames into a latest-frame slot stamped with capture time."""
+
+    def __init__(self, cap, name="capture"):
+        self.cap = cap
+        self.name = name
+        # Keep the driver buffer as small as the backend allows
+        try:
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except Exception:
+            pass
+
+        self.cond = threading.Condition()
+        self.frame = None
+        self.captured_at = None
+        self.seq = 0
+        self.last_read_seq = 0
+        self.running = False
+        self.ended = False
+        self.thread = None
+
+        self.frames_captured = 0
+        self.frames_analysed = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while self.running:
+            ret, frame = self.cap.read()
+            captured_at = time.monotonic()
+            with self.cond:
+                if not ret:
+                    self.ended = True
+                    self.cond.notify_all()
+                    break
+                # Overwrite the slot; a frame nobody picked up counts as dropped
+                if self.seq > self.last_read_seq:
+                    self.frames_dropped += 1
+                    metrics.FRAMES_DROPPED.inc()
+                self.frame = frame
+                self.captured_at = captured_at
+                self.seq += 1
+                self.frames_captured += 1
+                self.cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """Wait for a frame newer than the last one returned.
+
+        Returns (ok, frame, captured_at). ok is False once the source has
+        ended (or nothing arrives within timeout) and no unread frame is left.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > self.last_read_seq or self.ended or not self.running, timeout)
+            if self.seq <= self.last_read_seq:
+                return False, None, None
+            self.last_read_seq = self.seq
+            self.frames_analysed += 1
+            return True, self.frame, self.captured_at
+
+    def stop(self):
+        self.running = False
+        with self.cond:
+            self.cond.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+
+    def stats(self):
+        return {
+            'frames_captured': self.frames_captured,
+            'frames_analysed': self.frames_analysed,
+            'frames_dropped': self.frames_dropped,
+        }
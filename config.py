@@ -1,5 +1,7 @@
 # Configuration for Exam Surveillance
 
+import os
+
 # seconds to wait before flagging 'no face visible'
 NO_FACE_TIME = 5
 
@@ -50,6 +52,9 @@ SPEAKING_STARTUP_SKIP_FRAMES = 10
 MOUTH_ROI_DOWNSCALE = 2
 MOUTH_MOTION_THRESHOLD = 50
 SPEAKING_FRAME_THRESHOLD = 5
+# Frame-count settings above are converted to seconds at this rate, so detection
+# doesn't change when frames are dropped or inference is throttled
+REFERENCE_FPS = 30.0
 EVENT_MIN_SEPARATION = 2.0
 HEAD_TURN_FREQ_WINDOW = 5.0
 HEAD_TURN_FREQ_THRESHOLD = 3
@@ -62,14 +67,157 @@ SPEAKING_ALERT_COOLDOWN = 5.0
 WARNING_COOLDOWN = 5.0
 EXAM_DURATION_SECONDS = EXAM_DURATION_MINUTES * 60
 
+# Temporal rules evaluated by rules.RuleEngine on each frame's events
+# ('head_turn', 'write', 'suspicious', or another rule's name once it fires):
+#   count:    `count` events of `signal` within `window` seconds
+#   sequence: `first` followed by `then` within `within` seconds
+# Rules with a 'violation' label raise a warning while active, in list order.
+TEMPORAL_RULES = [
+    {"type": "count", "name": "head_turn_burst", "signal": "head_turn",
+     "count": HEAD_TURN_FREQ_THRESHOLD, "window": HEAD_TURN_FREQ_WINDOW,
+     "violation": "Head Turn Detected"},
+    {"type": "sequence", "name": "lookaway_write", "first": "head_turn", "then": "write",
+     "within": LOOKAWAY_WRITE_MAX_DELAY},
+    {"type": "count", "name": "copying", "signal": "lookaway_write",
+     "count": COPYING_WRITE_COUNT_THRESHOLD, "window": COPYING_WINDOW,
+     "violation": "Copying Suspected"},
+    {"type": "count", "name": "escalation", "signal": "suspicious",
+     "count": WRITE_EVENT_COUNT_THRESHOLD, "window": ALERT_EVENT_WINDOW,
+     "min_separation": EVENT_MIN_SEPARATION, "violation": "Repeated Suspicious Activity"},
+]
+
+# Multi-student web app: how many detection sessions one process may run at once
+MAX_SESSIONS = 40
+# What /start_detection may open besides camera indices: comma-separated file paths or
+# stream URLs from VIDEO_SOURCES. Any other source is refused.
+ALLOWED_SOURCES = tuple(s.strip() for s in os.environ.get("VIDEO_SOURCES", "").split(",") if s.strip())
+
+YOLO_MODEL_PATH = "yolov8n.pt"
+# Inference backend for the phone detector: torch, onnx, onnx-int8, openvino or openvino-int8.
+# Export non-torch backends first with: python backends.py export --backend <name>
+YOLO_BACKEND = os.environ.get("YOLO_BACKEND", "torch")
+# Allowed drop in recall/precision vs. torch for: python backends.py check
+BACKEND_CHECK_TOLERANCE = 0.05
+
+# Phone detector cadence: run YOLO every N frames and track boxes in between
+YOLO_EVERY_N_FRAMES = 3
+# Adapt N to the measured YOLO time so its cost per frame stays near the budget
+YOLO_ADAPTIVE_CADENCE = False
+YOLO_TARGET_MS_PER_FRAME = 15.0
+YOLO_MAX_EVERY_N_FRAMES = 8
+# Template-matching tracker: search margin (fraction of box size) and minimum match score
+PHONE_TRACK_SEARCH_MARGIN = 0.5
+PHONE_TRACK_MIN_SCORE = 0.5
+
+# Batch YOLO calls from all web sessions into one forward pass
+YOLO_BATCHING = True
+YOLO_BATCH_MAX_SIZE = 16
+# Longest the batcher waits for more frames after the first one arrives; it stops waiting
+# as soon as every running session has a frame in the batch
+YOLO_BATCH_WAIT_MS = 20
+
+# Hand-guided phone detection: run YOLO on crops around detected hands
+PHONE_ROI_MODE = False
+# Input size for hand crops (full frames use the model default of 640)
+PHONE_ROI_IMGSZ = 320
+# Padding around the hand box as a fraction of its size, and minimum crop side in pixels
+PHONE_ROI_MARGIN = 0.6
+PHONE_ROI_MIN_SIZE = 160
+# Frames between full-frame safety-net passes while in ROI mode
+PHONE_FULL_FRAME_INTERVAL = 30
+
+# Web app startup: models load lazily on the first /start_detection. MODEL_WARMUP=1 loads
+# them on a background thread right after import instead. Importing the app (models
+# excluded) should fit in STARTUP_BUDGET_SECONDS; check with: python bench.py startup
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "0") == "1"
+STARTUP_BUDGET_SECONDS = 1.0
+# PRELOAD_MODELS=1 loads YOLO weights at import; gunicorn.conf.py then turns on preload_app
+# so the master loads them once and forked workers share them copy-on-write
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "0") == "1"
+
+# Model worker processes for the web app (0 = run models on the session threads).
+# Frames reach the workers through shared-memory rings of WORKER_SLOTS slots each.
+MODEL_WORKERS = int(os.environ.get("MODEL_WORKERS", 0))
+WORKER_SLOTS = 4
+WORKER_SLOT_BYTES = 1280 * 720 * 3
+WORKER_HEALTH_INTERVAL = 1.0
+# Longest a detection thread waits for a free slot or a worker's reply before giving up on the frame
+WORKER_REQUEST_TIMEOUT = 10.0
+WORKER_START_METHOD = "spawn"
+
+# Threads per session for running independent detectors (FaceMesh, Hands, YOLO) in parallel
+PIPELINE_THREADS = 2
+
+# Cascade gating: skip Hands when no face is found, and run FaceMesh less often
+# once the face is steady (nose moved less than FACE_STABLE_DELTA, normalised,
+# for FACE_STABLE_FRAMES frames); it then runs every FACE_STABLE_INTERVAL frames
+CASCADE_GATING = True
+FACE_STABLE_DELTA = 0.01
+FACE_STABLE_FRAMES = 10
+FACE_STABLE_INTERVAL = 3
+
+# Speaking between FaceMesh passes: the mouth box from the last pass (padded by
+# MOUTH_ROI_PAD of the mouth width) is downscaled by MOUTH_ROI_DOWNSCALE and
+# differenced frame to frame. More than MOUTH_MOTION_THRESHOLD pixels changing by
+# over MOUTH_PIXEL_DELTA counts as a moving frame; SPEAKING_FRAME_THRESHOLD of them
+# (first SPEAKING_STARTUP_SKIP_FRAMES ignored) mean speaking. If more than
+# MOUTH_ROI_LOST_FRACTION of the box changes at once it is lost and FaceMesh reruns.
+MOUTH_MOTION_TRACKING = True
+MOUTH_ROI_PAD = 0.5
+MOUTH_ROI_MIN_SIZE = 8
+MOUTH_ROI_SHIFT = 0.25
+MOUTH_PIXEL_DELTA = 25
+MOUTH_ROI_LOST_FRACTION = 0.6
+
+# Motion gate: a frame is shrunk to MOTION_GATE_SIZE in grey and compared with the last
+# analysed frame; if under MOTION_GATE_THRESHOLD of its pixels changed by more than
+# MOTION_GATE_PIXEL_DELTA, the session reuses that frame's detector outputs instead of
+# running the models, for at most MOTION_GATE_MAX_AGE seconds. The mouth tracker still
+# runs every frame, so speaking is caught even while the gate holds.
+MOTION_GATE = True
+MOTION_GATE_SIZE = (64, 48)
+MOTION_GATE_PIXEL_DELTA = 15
+MOTION_GATE_THRESHOLD = 0.01
+MOTION_GATE_MAX_AGE = 1.0
+
+# /video_feed streams block until a new frame or a session state change; with neither,
+# the last frame is resent every STREAM_KEEPALIVE_SECONDS so closed connections are noticed
+STREAM_KEEPALIVE_SECONDS = 1.0
+# Per-viewer stream settings: /video_feed?fps=&width=&quality= fixes them (width=0 is
+# full size); otherwise a viewer starts on the first rung of (max width, JPEG quality,
+# fps) and moves down when writing a frame takes over STREAM_SLOW_BUSY of the frame
+# interval, back up after STREAM_UPGRADE_SECONDS below STREAM_FAST_BUSY
+STREAM_LADDER = ((640, 80, 30), (480, 70, 20), (320, 60, 10), (240, 50, 5))
+STREAM_MAX_FPS = 30
+STREAM_SLOW_BUSY = 0.5
+STREAM_FAST_BUSY = 0.1
+STREAM_UPGRADE_SECONDS = 5.0
+
+# /events (Server-Sent Events): the last EVENT_BACKLOG events per session are kept for
+# reconnecting clients; idle connections get a comment every EVENT_KEEPALIVE_SECONDS
+EVENT_BACKLOG = 200
+EVENT_KEEPALIVE_SECONDS = 15.0
+# A stream that ends because detection stopped asks EventSource to reconnect after this long
+EVENT_RETRY_MS = 1000
+# Session IDs outside this pattern are rejected (and get a 204 from /events)
+SESSION_ID_PATTERN = r"[A-Za-z0-9_.@-]{1,64}"
+
+# Async serving (asgi.py): /video_feed and /events run as coroutines on the event loop,
+# other routes on ASGI_WSGI_THREADS threads. gunicorn.conf.py uses uvicorn workers when
+# started as `gunicorn asgi:app`
+ASGI_WSGI_THREADS = 10
+
+# main.py headless mode (or --headless): no window, overlay or speech; violations are
+# still logged, saved and emailed, and a throughput summary prints every interval
+HEADLESS = os.environ.get("HEADLESS", "0") == "1"
+HEADLESS_SUMMARY_INTERVAL = 30.0
+
 # Email configuration for Gmail alerts
 # IMPORTANT: On Render, set these as environment variables
 # 1. Enable 2FA on your Gmail account
 # 2. Generate an App Password: https://myaccount.google.com/apppasswords
 # 3. Set environment variables in Render dashboard
 
-import os
-
 EMAIL_ADDRESS = os.environ.get("EMAIL_ADDRESS", "yourgmail@gmail.com")
 EMAIL_PASSWORD = os.environ.get("EMAIL_PASSWORD", "abcd-efgh-ijkl-mnop")
 AUTHORITY_EMAIL = os.environ.get("AUTHORITY_EMAIL", "authority@gmail.com")
@@ -0,0 +1,90 @@
+"""
+Per-session event log for the Server-Sent Events channel.
+
+A session publishes warnings, popups, bookings and state changes with
+publish(); each /events subscriber reads them in order with since() (or
+since_async() on the ASGI loop). IDs increase and the last EVENT_BACKLOG
+events are kept, so a reconnecting EventSource resumes from Last-Event-ID.
+close() ends every open stream when the session's run ends.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+import config
+import metrics
+from aio import Waiters, wait_for
+
+
+class Event(NamedTuple):
+    id: int
+    type: str
+    time: float      # wall clock, for display
+    data: dict
+
+
+def format_sse(event):
+    """One event in text/event-stream format."""
+    data = json.dumps(dict(event.data, time=time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(event.time))))
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+class EventLog:
+    """Sequenced, bounded log of one session's events that subscribers can wait on."""
+
+    def __init__(self, maxlen=None, first_id=0):
+        self.cond = threading.Condition()
+        self.waiters = Waiters()
+        self.events = deque(maxlen=maxlen or config.EVENT_BACKLOG)
+        self.first_id = first_id
+        self.seq = first_id
+        self.closed = False
+        self.subscribers = 0
+
+    def publish(self, kind, **data):
+        with self.cond:
+            if self.closed:
+                return
+            self.seq += 1
+            self.events.append(Event(self.seq, kind, time.time(), data))
+            self.cond.notify_all()
+            self.waiters.wake_all()
+        metrics.EVENTS.inc(type=kind)
+
+    def close(self):
+        """Stop taking events and wake every subscriber so its stream can end."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+            self.waiters.wake_all()
+
+    def since(self, last_id, timeout=None):
+        """Events after last_id, waiting up to timeout for one if there are none yet.
+
+        An empty list from a closed log means the stream is over.
+        """
+        with self.cond:
+            if last_id > self.seq:
+                # The client saw IDs from before a restart; replay what we have
+                last_id = 0
+            self.cond.wait_for(lambda: self.seq > last_id or self.closed, timeout)
+            return [e for e in self.events if e.id > last_id]
+
+    async def since_async(self, last_id, timeout=None):
+        """since() for coroutines."""
+        if last_id > self.seq:
+            last_id = 0
+        await wait_for(self.cond, self.waiters, lambda: self.seq > last_id or self.closed, timeout)
+        with self.cond:
+            return [e for e in self.events if e.id > last_id]
+
+    def subscribe(self):
+        with self.cond:
+            self.subscribers += 1
+
+    def unsubscribe(self):
+        with self.cond:
+            self.subscribers -= 1
@@ -0,0 +1,115 @@
+"""
+Landmark feature extraction.
+
+The rule logic used to read MediaPipe protobuf landmarks one attribute at
+a time (fl.landmark[13].y, hl.landmark[0].y, ...) all over the detection
+loops. This module turns each frame's face and hand results into NumPy
+arrays once and computes every geometric feature from those arrays: mouth
+open ratio, yaw proxy, palm-to-mouth distance for every hand and iris
+offsets. The loops consume the typed FrameFeatures record, which can also
+be stored and re-scored offline.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# Face mesh indices the features need (iris centres exist with refine_landmarks=True)
+NOSE_TIP = 1
+UPPER_LIP = 13
+LOWER_LIP = 14
+MOUTH_LEFT = 78
+MOUTH_RIGHT = 308
+LEFT_EYE_OUTER = 33
+LEFT_EYE_INNER = 133
+RIGHT_EYE_INNER = 362
+RIGHT_EYE_OUTER = 263
+LEFT_IRIS = 468
+RIGHT_IRIS = 473
+FACE_POINTS = (NOSE_TIP, UPPER_LIP, LOWER_LIP, MOUTH_LEFT, MOUTH_RIGHT,
+               LEFT_EYE_OUTER, LEFT_EYE_INNER, RIGHT_EYE_INNER, RIGHT_EYE_OUTER,
+               LEFT_IRIS, RIGHT_IRIS)
+_ROW = {idx: row for row, idx in enumerate(FACE_POINTS)}
+
+WRIST = 0
+
+
+class FaceFeatures(NamedTuple):
+    points: np.ndarray          # (len(FACE_POINTS), 3) x, y, z of the key points
+    mouth_ratio: float          # lip gap / mouth width
+    mouth_y: float              # upper lip y, normalised
+    yaw: float                  # nose x minus eye-centre x; <0 left, >0 right
+    iris_offset: Optional[np.ndarray]  # (2,) left/right iris position across the eye, 0.5 = centred
+
+
+class FrameFeatures(NamedTuple):
+    face: Optional[FaceFeatures]
+    hands: np.ndarray           # (n_hands, 21, 3)
+    palm_mouth_dist: np.ndarray  # (n_hands,) |wrist y - mouth y|; empty without a face
+
+    @property
+    def has_face(self):
+        return self.face is not None
+
+    @property
+    def has_hands(self):
+        return len(self.hands) > 0
+
+
+def num_points(landmark_list):
+    points = getattr(landmark_list, 'points', None)
+    return len(points) if points is not None else len(landmark_list.landmark)
+
+
+def landmarks_to_array(landmark_list, indices=None):
+    """Convert a landmark list (MediaPipe or workers.LandmarkList) to an (N, 3) float32 array."""
+    points = getattr(landmark_list, 'points', None)
+    n_points = num_points(landmark_list)
+    if indices is not None:
+        # Meshes without iris refinement have 468 points; missing ones read as the first point
+        indices = [i if i < n_points else 0 for i in indices]
+    if points is not None:
+        return points if indices is None else points[indices]
+    lms = landmark_list.landmark
+    if indices is not None:
+        lms = [lms[i] for i in indices]
+    return np.array([(lm.x, lm.y, lm.z) for lm in lms], dtype=np.float32)
+
+
+def face_features(face_results):
+    """Features of the first detected face, or None without one."""
+    if face_results is None or not face_results.multi_face_landmarks:
+        return None
+    landmark_list = face_results.multi_face_landmarks[0]
+    n_points = num_points(landmark_list)
+    p = landmarks_to_array(landmark_list, FACE_POINTS)
+
+    x, y = p[:, 0], p[:, 1]
+    mouth_ratio = abs(y[_ROW[LOWER_LIP]] - y[_ROW[UPPER_LIP]]) / (abs(x[_ROW[MOUTH_RIGHT]] - x[_ROW[MOUTH_LEFT]]) + 1e-6)
+    yaw = x[_ROW[NOSE_TIP]] - (x[_ROW[LEFT_EYE_OUTER]] + x[_ROW[RIGHT_EYE_OUTER]]) / 2
+
+    iris_offset = None
+    if n_points > RIGHT_IRIS:
+        corners_a = x[[_ROW[LEFT_EYE_OUTER], _ROW[RIGHT_EYE_INNER]]]
+        corners_b = x[[_ROW[LEFT_EYE_INNER], _ROW[RIGHT_EYE_OUTER]]]
+        iris = x[[_ROW[LEFT_IRIS], _ROW[RIGHT_IRIS]]]
+        iris_offset = (iris - corners_a) / (corners_b - corners_a + 1e-6)
+
+    return FaceFeatures(p, float(mouth_ratio), float(y[_ROW[UPPER_LIP]]), float(yaw), iris_offset)
+
+
+def hand_array(hand_results):
+    """All detected hands as one (n_hands, 21, 3) array."""
+    if hand_results is None or not hand_results.multi_hand_landmarks:
+        return np.empty((0, 21, 3), dtype=np.float32)
+    return np.stack([landmarks_to_array(hl) for hl in hand_results.multi_hand_landmarks])
+
+
+def frame_features(face, hand_results):
+    """Combine precomputed FaceFeatures with this frame's hands."""
+    hands = hand_array(hand_results)
+    if face is None or len(hands) == 0:
+        dist = np.empty(0, dtype=np.float32)
+    else:
+        dist = np.abs(hands[:, WRIST, 1] - face.mouth_y)
+    return FrameFeatures(face, hands, dist)
@@ -0,0 +1,57 @@
+"""
+Gunicorn settings, picked up automatically from the working directory.
+
+With PRELOAD_MODELS=1 the app (and its YOLO weights and model modules) is
+imported once in the master before forking, so workers share those pages
+copy-on-write instead of each loading their own copy. post_fork then
+reinitialises what can't cross a fork: locks, the TTS thread, the
+inference batcher and model worker processes.
+
+Each worker logs its memory right after the fork and again once it is
+ready to serve; compare PSS with and without PRELOAD_MODELS to see what the
+sharing saves. GET /memory reports a worker's current numbers.
+
+`gunicorn asgi:app` runs on uvicorn workers, and the streaming routes run
+as coroutines so open streams don't each hold a worker. `gunicorn app:app`
+(render.yaml) stays on sync workers, which keep one connection per worker,
+streams included.
+"""
+
+import gc
+import os
+import sys
+
+import config
+from metrics import process_memory
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+preload_app = config.PRELOAD_MODELS
+# The app target decides: asgi:app needs uvicorn workers, the Flask WSGI app needs sync ones
+serving_asgi = any(arg.split(":")[0] == "asgi" for arg in sys.argv[1:])
+worker_class = "uvicorn.workers.UvicornWorker" if serving_asgi else "sync"
+
+
+def _memory(pid="self"):
+    mem = process_memory(pid)
+    if not mem:
+        return "memory n/a"
+    return ", ".join(f"{k[:-3]} {v} MB" for k, v in sorted(mem.items()))
+
+
+def when_ready(server):
+    if preload_app:
+        # Keep the cyclic GC from writing to (and so un-sharing) the preloaded objects
+        gc.freeze()
+    server.log.info(f"Master {os.getpid()} ready (preload_app={preload_app}): {_memory()}")
+
+
+def post_fork(server, worker):
+    app_module = sys.modules.get("app")
+    if app_module is not None and hasattr(app_module, "after_fork"):
+        app_module.after_fork()
+    server.log.info(f"Worker {worker.pid} forked: {_memory()}")
+
+
+def post_worker_init(worker):
+    worker.log.info(f"Worker {worker.pid} ready: {_memory()}")
@@ -0,0 +1,164 @@
+"""
+Shared, batched YOLO inference for concurrent sessions.
+
+Calling the model once per stream with batch size 1 wastes most of its
+throughput. BatchInferenceService collects the frames submitted by all
+active sessions for up to config.YOLO_BATCH_WAIT_MS (or until
+config.YOLO_BATCH_MAX_SIZE frames are waiting), runs one batched forward
+pass and hands each session back its own 'cell phone' boxes. Each
+session has at most one request in flight (a full frame, or its hand
+crops queued together via submit_many()), so once the batch holds as
+many requests as there are running sessions it goes at once; a lone
+session never waits for the window.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+from phone_detector import phone_boxes
+
+
+class BatchInferenceService:
+    """Background thread that batches phone-detection requests across sessions."""
+
+    def __init__(self, model, conf=0.5, iou=0.5, max_batch=None, wait_ms=None, active_sources=None):
+        self.model = model
+        # Callable giving the number of sessions that may submit frames; None = always wait
+        self.active_sources = active_sources
+        self.conf = conf
+        self.iou = iou
+        self.max_batch = max_batch or config.YOLO_BATCH_MAX_SIZE
+        self.wait_ms = config.YOLO_BATCH_WAIT_MS if wait_ms is None else wait_ms
+
+        self.requests = queue.Queue()
+        self.running = False
+        self.thread = None
+        self.stats_lock = threading.Lock()
+
+        self.batches = 0
+        self.frames = 0
+        self.last_batch_size = 0
+        self.last_batch_ms = None
+        self.avg_batch_ms = None
+        self.max_batch_ms = 0.0
+
+    def start(self):
+        if self.running:
+            return self
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="yolo-batcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.requests.put(None)
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+
+    def submit(self, frame, imgsz=None):
+        """Queue a BGR frame and return a Future resolving to its phone boxes.
+
+        imgsz overrides the model's input size (used for small hand crops).
+        """
+        return self.submit_many([frame], imgsz)[0]
+
+    def submit_many(self, frames, imgsz=None):
+        """Queue several frames as one request so they land in the same batch."""
+        futures = [Future() for _ in frames]
+        self.requests.put((frames, imgsz, futures))
+        return futures
+
+    def detect(self, frame, imgsz=None, timeout=None):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(frame, imgsz).result(timeout)
+
+    def _collect(self):
+        first = self.requests.get()
+        if first is None:
+            return []
+        batch = [first]
+        size = len(first[0])
+        # Take whatever is already queued without waiting
+        while size < self.max_batch:
+            try:
+                item = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch
+            batch.append(item)
+            size += len(item[0])
+        # Requests, not frames: a session's hand crops arrive as one request
+        expected = self.max_batch if self.active_sources is None else min(self.active_sources(), self.max_batch)
+        deadline = time.perf_counter() + self.wait_ms / 1000.0
+        while len(batch) < expected and size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while self.running:
+            batch = self._collect()
+            if not batch:
+                continue
+            start = time.perf_counter()
+            # One forward pass per input size; full frames and hand crops don't mix
+            groups = {}
+            for frames, imgsz, futures in batch:
+                groups.setdefault(imgsz, []).extend(zip(frames, futures))
+            for imgsz, items in groups.items():
+                kwargs = {'imgsz': imgsz} if imgsz else {}
+                try:
+                    results = self.model([frame for frame, _ in items], conf=self.conf, iou=self.iou, verbose=False, **kwargs)
+                except Exception as e:
+                    print(f"Batched inference failed: {e}")
+                    for _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(items, results):
+                    try:
+                        boxes = phone_boxes(result, self.model.names)
+                    except Exception as e:
+                        print(f"Reading batched result failed: {e}")
+                        future.set_exception(e)
+                        continue
+                    future.set_result(boxes)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self._record(sum(len(frames) for frames, _, _ in batch), elapsed_ms)
+
+    def _record(self, size, elapsed_ms):
+        with self.stats_lock:
+            self.batches += 1
+            self.frames += size
+            self.last_batch_size = size
+            self.last_batch_ms = elapsed_ms
+            self.avg_batch_ms = elapsed_ms if self.avg_batch_ms is None else 0.9 * self.avg_batch_ms + 0.1 * elapsed_ms
+            self.max_batch_ms = max(self.max_batch_ms, elapsed_ms)
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'batches': self.batches,
+                'frames': self.frames,
+                'avg_batch_size': round(self.frames / self.batches, 2) if self.batches else 0,
+                'last_batch_size': self.last_batch_size,
+                'last_batch_ms': round(self.last_batch_ms, 2) if self.last_batch_ms is not None else None,
+                'avg_batch_ms': round(self.avg_batch_ms, 2) if self.avg_batch_ms is not None else None,
+                'max_batch_ms': round(self.max_batch_ms, 2),
+                'pending': self.requests.qsize(),
+                'max_batch': self.max_batch,
+                'wait_ms': self.wait_ms,
+            }
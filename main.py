@@ -1,17 +1,32 @@
+import argparse
 import cv2
+import signal
 import time
 import threading
 import queue
 import numpy as np
 import mediapipe as mp
-import pyttsx3
 import config
 from utils import log_violation, save_screenshot
-from ultralytics import YOLO
+from capture import FrameGrabber
+from phone_detector import PhoneDetector
+from backends import load_yolo
+from features import face_features, frame_features
+from scoring import FrameScorer
 import smtplib
 import ssl
 import sqlite3
 
+# ================= MODE =========================
+parser = argparse.ArgumentParser(description="AI exam surveillance on a local camera")
+parser.add_argument("--headless", action="store_true", default=config.HEADLESS,
+                    help="no window, overlay or speech; print periodic throughput summaries")
+parser.add_argument("--source", default="0", help="camera index, stream URL or video file")
+args = parser.parse_args()
+HEADLESS = args.headless
+SOURCE = int(args.source) if args.source.isdigit() else args.source
+# ===============================================
+
 # ================= DATABASE SETUP =================
 conn = sqlite3.connect('violations.db')
 c = conn.cursor()
@@ -56,30 +71,34 @@ def save_violation_to_db(violation_name, warning_count, screenshot_path):
     conn.commit()
 
 # ================= YOLO =========================
-yolo_model = YOLO("yolov8n.pt")
+yolo_model = load_yolo()
 PHONE_CLASS_NAME = "cell phone"
 PHONE_MIN_CONF = 0.25
 PHONE_MIN_TIME = 0.6
-phone_start_time = None
+# Runs YOLO every config.YOLO_EVERY_N_FRAMES frames and tracks boxes in between
+phone_detector = PhoneDetector(yolo_model, conf=PHONE_MIN_CONF, iou=0.45)
 # ===============================================
 
 # ================= VOICE ========================
 voice_queue = queue.Queue()
-engine = pyttsx3.init()
-engine.setProperty("rate", 140)
-engine.setProperty("volume", 1.0)
 
 def voice_worker():
+    import pyttsx3
+    engine = pyttsx3.init()
+    engine.setProperty("rate", 140)
+    engine.setProperty("volume", 1.0)
     while True:
         text = voice_queue.get()
         engine.say(text)
         engine.runAndWait()
         voice_queue.task_done()
 
-threading.Thread(target=voice_worker, daemon=True).start()
+# Headless boxes have no audio; never start the TTS engine there
+if not HEADLESS:
+    threading.Thread(target=voice_worker, daemon=True).start()
 
 def speak(text):
-    if voice_queue.empty():
+    if not HEADLESS and voice_queue.empty():
         voice_queue.put(text)
 # ===============================================
 
@@ -93,11 +112,14 @@ hands = mp_hands.Hands(max_num_hands=2,
                        min_tracking_confidence=0.6)
 # ===============================================
 
-cap = cv2.VideoCapture(0)
+cap = cv2.VideoCapture(SOURCE)
 if not cap.isOpened():
     print("Camera not found")
     exit()
 
+# Read frames on their own thread so inference always sees the newest one
+grabber = FrameGrabber(cap).start()
+
 # ================= TIMER ========================
 EXAM_DURATION_SECONDS = 120
 first_frame_seen = False
@@ -105,7 +127,7 @@ exam_start_time = None
 exam_ended_announced = False
 # ===============================================
 
-last_alert_time = 0
+last_alert_time = float('-inf')
 popup_message = ""
 popup_end_time = 0
 
@@ -120,44 +142,66 @@ MAX_WARNINGS = 3
 # ================= SPEAK SETTINGS ===============
 SPEAK_MIN_TIME = 0.8
 MOUTH_OPEN_MIN = 0.006
-last_mouth_ratio = None
-mouth_motion_counter = 0
-MOUTH_MOTION_DIFF = 0.0012
-speaking_start_time = None
+MOUTH_MOTION_SPEED = 0.036   # mouth ratio change per second
 # ===============================================
 
 # ================= HAND + HEAD ==================
 HEAD_TURN_THRESHOLD = 0.05
-HEAD_TURN_WINDOW = 5
-head_turn_timestamps = []
-last_turn_direction = None
-hand_start_time = None
-hand_near_mouth = False
 # ===============================================
 
-def lip_distance_ratio(landmarks):
-    top = landmarks[13].y
-    bottom = landmarks[14].y
-    left = landmarks[78].x
-    right = landmarks[308].x
-    return abs(bottom - top) / (abs(right - left) + 1e-6)
+# Timers, counters and the temporal rules (head-turn bursts, copying, escalation)
+scorer = FrameScorer(phone_min_time=PHONE_MIN_TIME, mouth_open_min=MOUTH_OPEN_MIN,
+                     mouth_motion_speed=MOUTH_MOTION_SPEED, mouth_motion_time=0.07,
+                     speak_min_time=SPEAK_MIN_TIME, hand_far_dist=0.05, hand_min_time=0.7,
+                     head_turn_threshold=HEAD_TURN_THRESHOLD)
+
+# ================= STOP & SUMMARY ================
+stop_requested = False
+
+def request_stop(signum, frame):
+    global stop_requested
+    stop_requested = True
+
+signal.signal(signal.SIGINT, request_stop)
+signal.signal(signal.SIGTERM, request_stop)
+
+summary_start = time.monotonic()
+summary_frames = 0
+summary_loop_ms = 0.0
+summary_dropped = 0
+summary_yolo_calls = 0
+
+def print_summary(now):
+    global summary_start, summary_frames, summary_loop_ms, summary_dropped, summary_yolo_calls
+    span = max(now - summary_start, 1e-6)
+    dropped = grabber.frames_dropped - summary_dropped
+    yolo_calls = phone_detector.yolo_calls - summary_yolo_calls
+    avg_ms = summary_loop_ms / summary_frames if summary_frames else 0.0
+    print(f"[THROUGHPUT] {summary_frames / span:.1f} fps over {span:.0f}s, "
+          f"{avg_ms:.1f} ms/frame, {dropped} dropped, {yolo_calls} YOLO calls, {warning_count} warnings")
+    summary_start, summary_frames, summary_loop_ms = now, 0, 0.0
+    summary_dropped, summary_yolo_calls = grabber.frames_dropped, phone_detector.yolo_calls
+# ===============================================
 
 # ================= LOOP =========================
-while True:
-    ret, frame = cap.read()
+while not stop_requested:
+    ret, frame, captured_at = grabber.read()
     if not ret:
-        break
+        if grabber.ended:
+            break
+        continue
 
+    loop_start = time.perf_counter()
     rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    now = time.time()
+    now = captured_at
 
     # ================= EXAM TIMER =================
     if not first_frame_seen:
         first_frame_seen = True
-        exam_start_time = time.time()
+        exam_start_time = now
         speak("Your exam starts now")
 
-    elapsed = int(time.time() - exam_start_time)
+    elapsed = int(now - exam_start_time)
 
     if elapsed >= EXAM_DURATION_SECONDS and not exam_ended_announced:
         speak("The exam has ended")
@@ -165,103 +209,30 @@ while True:
 
     detection_enabled = warning_count < MAX_WARNINGS
 
-    # ================= PHONE DETECTION =================
-    phone_detected = False
-    if detection_enabled:
-        results = yolo_model(frame, conf=PHONE_MIN_CONF, iou=0.45, verbose=False)
-        for r in results:
-            for box in r.boxes:
-                cls = int(box.cls[0])
-                name = yolo_model.names[cls]
-                if name == PHONE_CLASS_NAME:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                    cv2.putText(frame, "Phone", (x1, y1-8),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                    if phone_start_time is None:
-                        phone_start_time = now
-                    if now - phone_start_time > PHONE_MIN_TIME:
-                        phone_detected = True
-    else:
-        phone_start_time = None
-
-    # ================= FACE & SPEAK =================
-    speaking_detected = False
-    face_results = face_mesh.process(rgb)
-
-    if detection_enabled and face_results.multi_face_landmarks:
-        for fl in face_results.multi_face_landmarks:
-            ratio = lip_distance_ratio(fl.landmark)
-            if last_mouth_ratio is None:
-                last_mouth_ratio = ratio
-            diff = abs(ratio - last_mouth_ratio)
-            last_mouth_ratio = ratio
-
-            if ratio > MOUTH_OPEN_MIN and diff > MOUTH_MOTION_DIFF:
-                mouth_motion_counter += 1
-            else:
-                mouth_motion_counter = 0
-                speaking_start_time = None
-
-            if mouth_motion_counter > 2 and not hand_near_mouth:
-                if speaking_start_time is None:
-                    speaking_start_time = now
-                if now - speaking_start_time > SPEAK_MIN_TIME:
-                    speaking_detected = True
-                    cv2.putText(frame, "Speaking", (10, 100),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-
-    # ================= HAND DETECTION =================
-    hand_suspicious = False
+    # Hands run first so phone detection can look around them
     hand_results = hands.process(rgb)
-    if detection_enabled and hand_results.multi_hand_landmarks and face_results.multi_face_landmarks:
-        mouth_y = fl.landmark[13].y
-        for hl in hand_results.multi_hand_landmarks:
-            palm_y = hl.landmark[0].y
-            distance = abs(palm_y - mouth_y)
-            if distance < 0.035:
-                hand_near_mouth = True
-            if distance < 0.05:
-                hand_start_time = None
-                continue
-            if hand_start_time is None:
-                hand_start_time = now
-            if now - hand_start_time > 0.7:
-                hand_suspicious = True
-                cv2.putText(frame, "Hand Gesture", (10, 130),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-    else:
-        hand_start_time = None
-
-    # ================= HEAD TURN =================
-    head_turn_detected = False
-    if detection_enabled and face_results.multi_face_landmarks:
-        nose_x = fl.landmark[1].x
-        eye_center_x = (fl.landmark[33].x + fl.landmark[263].x) / 2
-        diff = nose_x - eye_center_x
-        turn_direction = None
-        if diff < -HEAD_TURN_THRESHOLD:
-            turn_direction = 'left'
-        elif diff > HEAD_TURN_THRESHOLD:
-            turn_direction = 'right'
-        if turn_direction and turn_direction != last_turn_direction:
-            head_turn_timestamps.append(now)
-            last_turn_direction = turn_direction
-        head_turn_timestamps = [t for t in head_turn_timestamps if now - t <= HEAD_TURN_WINDOW]
-        if len(head_turn_timestamps) >= 3:
-            head_turn_detected = True
 
-    # ================= ALERT & VIOLATION =================
-    violation_name = None
-    if phone_detected:
-        violation_name = "Phone Detected"
-    elif speaking_detected:
-        violation_name = "Speaking Detected"
-    elif hand_suspicious:
-        violation_name = "Hand Gesture Detected"
-    elif head_turn_detected:
-        violation_name = "Head Turn Detected"
+    # ================= DETECTION =================
+    boxes = phone_detector.detect(frame, hand_results.multi_hand_landmarks) if detection_enabled else []
+    feats = frame_features(face_features(face_mesh.process(rgb)), hand_results)
+    verdict = scorer.update(now, feats, boxes, detection_enabled=detection_enabled, frame_height=frame.shape[0])
+    phone_detected, speaking_detected, hand_suspicious = verdict.phone, verdict.speaking, verdict.hand
+    head_turn_detected = "Head Turn Detected" in verdict.rule_violations
+    violation_name = verdict.violation
+
+    if not HEADLESS:
+        for x1, y1, x2, y2 in boxes:
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+            cv2.putText(frame, "Phone", (x1, y1-8),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        if speaking_detected:
+            cv2.putText(frame, "Speaking", (10, 100),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        if hand_suspicious:
+            cv2.putText(frame, "Hand Gesture", (10, 130),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
 
+    # ================= ALERT & VIOLATION =================
     if violation_name and now - last_alert_time > 6 and detection_enabled:
         last_alert_time = now
         warning_count += 1
@@ -287,6 +258,13 @@ while True:
         speak(popup_message)
         send_email_alert(violation_name, warning_count)
 
+    summary_frames += 1
+    summary_loop_ms += (time.perf_counter() - loop_start) * 1000
+    if HEADLESS:
+        if time.monotonic() - summary_start >= config.HEADLESS_SUMMARY_INTERVAL:
+            print_summary(time.monotonic())
+        continue
+
     # ================= UI ========================
     cv2.putText(frame, f"Student ID: {config.STUDENT_ID}", (10, 20),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
@@ -295,7 +273,7 @@ while True:
     cv2.putText(frame, f"Time: {elapsed//60:02d}:{elapsed%60:02d}", (10, 70),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
 
-    if time.time() < popup_end_time:
+    if now < popup_end_time:
         cv2.putText(frame, popup_message, (160, 40),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
 
@@ -303,5 +281,11 @@ while True:
     if cv2.waitKey(1) & 0xFF in [27, ord("q")]:
         break
 
+if HEADLESS and summary_frames:
+    print_summary(time.monotonic())
+grabber.stop()
 cap.release()
-cv2.destroyAllWindows()
+if not HEADLESS:
+    cv2.destroyAllWindows()
+print(f"Frames captured: {grabber.frames_captured}, analysed: {grabber.frames_analysed}, dropped: {grabber.frames_dropped}")
+print(f"YOLO calls: {phone_detector.yolo_calls} for {phone_detector.frames} frames")
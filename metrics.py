@@ -0,0 +1,194 @@
+"""
+In-process metrics exposed in Prometheus text format.
+
+A deliberately small stand-in for prometheus_client: counters, histograms
+and callback gauges kept in a module-level registry and rendered by the
+/metrics routes of app.py and app_cloud.py. Updates are a dict lookup and
+an add under a per-metric lock (a histogram adds a bisect over its
+buckets), so instrumenting every frame costs microseconds against frame
+times in the tens of milliseconds. Stdlib only, so the cloud dashboard can
+import it without the detection stack.
+"""
+
+import bisect
+import threading
+
+# Seconds; covers cheap stages (cvtColor, rules) up to a slow YOLO pass
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        # Unlabelled metrics report zero before their first update
+        self.values = {} if self.labels else {(): 0}
+        self.lock = threading.Lock()
+        _register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        return [(self.name, _format_labels(self.labels, key), value) for key, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., sum, count]
+        self.series = {} if self.labels else {(): [0] * (len(self.buckets) + 2)}
+        self.lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(series)) for key, series in self.series.items()]
+        out = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                out.append((f"{self.name}_bucket", _format_labels(self.labels, key, [("le", _format_value(bound))]), cumulative))
+            out.append((f"{self.name}_bucket", _format_labels(self.labels, key, [("le", "+Inf")]), series[-1]))
+            out.append((f"{self.name}_sum", _format_labels(self.labels, key), series[-2]))
+            out.append((f"{self.name}_count", _format_labels(self.labels, key), series[-1]))
+        return out
+
+
+class Gauge:
+    """Value read at scrape time from fn().
+
+    fn returns a number, or a dict mapping label-value tuples to numbers.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, help, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.labels = tuple(labels)
+        _register(self)
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"Metric {self.name} failed: {e}")
+            return []
+        if isinstance(value, dict):
+            return [(self.name, _format_labels(self.labels, key), v) for key, v in value.items()]
+        return [(self.name, "", value)]
+
+
+def process_memory(pid="self"):
+    """RSS, PSS and shared memory of a process in MB (Linux /proc); empty dict elsewhere.
+
+    PSS splits shared pages between the processes mapping them, so it shows
+    what copy-on-write sharing actually saves where RSS does not.
+    """
+    fields = {'Rss': 'rss_mb', 'Pss': 'pss_mb', 'Shared_Clean': 'shared_mb', 'Shared_Dirty': 'shared_mb'}
+    out = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", encoding="ascii") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in fields:
+                    out[fields[key]] = out.get(fields[key], 0.0) + int(rest.split()[0]) / 1024
+    except OSError:
+        return {}
+    return {k: round(v, 1) for k, v in out.items()}
+
+
+def reset_after_fork():
+    """Give every metric a fresh lock; a forked child must not inherit one held by another thread."""
+    global _registry_lock
+    _registry_lock = threading.Lock()
+    for metric in _registry:
+        if hasattr(metric, 'lock'):
+            metric.lock = threading.Lock()
+
+
+def render():
+    """All registered metrics in Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Metrics shared by the detection code; gauges are registered by the apps
+STAGE_LATENCY = Histogram("exam_stage_latency_seconds", "Per-frame latency of each detection stage", labels=("stage",))
+FRAME_LATENCY = Histogram("exam_frame_latency_seconds", "Capture-to-annotated-frame latency")
+FRAMES_PROCESSED = Counter("exam_frames_processed_total", "Frames run through detection")
+FRAMES_DROPPED = Counter("exam_frames_dropped_total", "Captured frames replaced by a newer one before detection read them")
+VIOLATIONS = Counter("exam_violations_total", "Warnings booked", labels=("violation",))
+EMAILS = Counter("exam_emails_total", "Alert emails attempted", labels=("kind", "result"))
+STREAM_ENCODES = Counter("exam_stream_encodes_total", "Annotated frames JPEG-encoded for /video_feed")
+STREAM_FRAMES_SENT = Counter("exam_stream_frames_sent_total", "Frames written to /video_feed viewers")
+STREAM_FRAMES_SKIPPED = Counter("exam_stream_frames_skipped_total", "Frames a slow /video_feed viewer skipped to stay current")
+STREAM_QUALITY_CHANGES = Counter("exam_stream_quality_changes_total", "Adaptive /video_feed viewers moved along the quality ladder", labels=("direction",))
+EVENTS = Counter("exam_events_total", "Events pushed to /events subscribers", labels=("type",))
+MOTION_GATE = Counter("exam_motion_gate_total", "Frames checked by the motion gate; hit = detector outputs reused", labels=("result",))
@@ -0,0 +1,70 @@
+"""
+Global motion gate for the detection loop.
+
+A student sitting still produces long runs of nearly identical frames.
+MotionGate shrinks each frame to a small grey thumbnail and compares it
+with the thumbnail of the last frame the detectors actually ran on; while
+the fraction of thumbnail pixels that changed by more than
+MOTION_GATE_PIXEL_DELTA stays under MOTION_GATE_THRESHOLD the caller reuses
+that frame's detector outputs instead of running the models again. Reuse
+is capped at MOTION_GATE_MAX_AGE seconds so a slow drift can't leave the
+outputs stale indefinitely. Comparing against the last analysed frame
+rather than the previous one means small changes add up until they trip
+the gate. A frame only becomes the reference once the caller reports with
+accept() that the detectors ran on it, so a failed run is never reused.
+"""
+
+import cv2
+import numpy as np
+
+import config
+import metrics
+
+
+class MotionGate:
+    """Decides per frame whether the last detector outputs can be reused."""
+
+    def __init__(self, threshold=None, size=None, max_age=None):
+        self.threshold = config.MOTION_GATE_THRESHOLD if threshold is None else threshold
+        self.size = size or config.MOTION_GATE_SIZE
+        self.max_age = config.MOTION_GATE_MAX_AGE if max_age is None else max_age
+        self.reset()
+
+    def reset(self):
+        self.reference = None
+        self.reference_time = None
+        self.candidate = None
+        self.last_score = None
+        self.hits = 0
+        self.misses = 0
+
+    def check(self, frame, now):
+        """True to reuse the last outputs for this frame; False means run the detectors, then call accept()."""
+        # INTER_LINEAR is ~20x cheaper than INTER_AREA here; the pixel delta absorbs its extra noise
+        small = cv2.cvtColor(cv2.resize(frame, self.size, interpolation=cv2.INTER_LINEAR), cv2.COLOR_BGR2GRAY)
+        if self.reference is not None and now - self.reference_time <= self.max_age:
+            changed = np.count_nonzero(cv2.absdiff(small, self.reference) > config.MOTION_GATE_PIXEL_DELTA)
+            self.last_score = float(changed / small.size)
+            if self.last_score < self.threshold:
+                self.hits += 1
+                metrics.MOTION_GATE.inc(result="hit")
+                return True
+        self.candidate = (small, now)
+        self.misses += 1
+        metrics.MOTION_GATE.inc(result="miss")
+        return False
+
+    def accept(self):
+        """The detectors ran on the last frame check() turned down: compare later frames with it."""
+        if self.candidate is not None:
+            self.reference, self.reference_time = self.candidate
+            self.candidate = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'last_score': round(self.last_score, 4) if self.last_score is not None else None,
+        }
@@ -0,0 +1,113 @@
+"""
+Cheap speaking detection by frame differencing inside the mouth region.
+
+MouthMotionDetector crops the mouth box from the last FaceMesh pass,
+downscales it by MOUTH_ROI_DOWNSCALE and counts changed pixels per frame.
+update() returns None when the region is lost; the caller then falls back
+to the landmark mouth ratio and re-locates the mouth with FaceMesh.
+"""
+
+import cv2
+import numpy as np
+
+import config
+from features import _ROW, LOWER_LIP, MOUTH_LEFT, MOUTH_RIGHT, UPPER_LIP
+from scoring import MAX_SAMPLE_GAP
+
+
+def mouth_box(face, frame_shape, pad=None):
+    """Pixel box (x1, y1, x2, y2) around the lips of a FaceFeatures, or None if it is off-frame."""
+    pad = config.MOUTH_ROI_PAD if pad is None else pad
+    h, w = frame_shape[:2]
+    p = face.points
+    left, right = p[_ROW[MOUTH_LEFT], 0] * w, p[_ROW[MOUTH_RIGHT], 0] * w
+    cx = (left + right) / 2
+    cy = (p[_ROW[UPPER_LIP], 1] + p[_ROW[LOWER_LIP], 1]) / 2 * h
+    # The mouth is roughly as tall as it is wide when open; pad both ways for movement
+    half = abs(right - left) * (0.5 + pad)
+    x1, y1 = max(int(cx - half), 0), max(int(cy - half), 0)
+    x2, y2 = min(int(cx + half), w), min(int(cy + half), h)
+    if x2 - x1 < config.MOUTH_ROI_MIN_SIZE or y2 - y1 < config.MOUTH_ROI_MIN_SIZE:
+        return None
+    return x1, y1, x2, y2
+
+
+class MouthMotionDetector:
+    """Tracks motion inside the mouth box between FaceMesh passes."""
+
+    def __init__(self, downscale=None, motion_threshold=None, motion_time=None, skip_time=None):
+        self.downscale = downscale or config.MOUTH_ROI_DOWNSCALE
+        self.motion_threshold = config.MOUTH_MOTION_THRESHOLD if motion_threshold is None else motion_threshold
+        self.motion_time = motion_time or config.SPEAKING_FRAME_THRESHOLD / config.REFERENCE_FPS
+        self.skip_time = config.SPEAKING_STARTUP_SKIP_FRAMES / config.REFERENCE_FPS if skip_time is None else skip_time
+        self.reset()
+
+    def reset(self):
+        self.box = None
+        self.prev = None
+        self.prev_time = None
+        self.moving_time = 0.0
+        self.skip_until = None
+        self.frames = 0
+        self.lost_count = 0
+
+    def lose(self):
+        if self.box is not None:
+            self.lost_count += 1
+        self.box = None
+        self.prev = None
+        self.moving_time = 0.0
+
+    def locate(self, face, frame_shape):
+        """Place the box from fresh FaceMesh features; keep it (and its history) if the mouth barely moved."""
+        box = mouth_box(face, frame_shape) if face is not None else None
+        if box is None:
+            self.lose()
+            return
+        if self.box is not None:
+            size = self.box[2] - self.box[0]
+            shift = max(abs(a - b) for a, b in zip(box, self.box))
+            if shift <= size * config.MOUTH_ROI_SHIFT:
+                return
+        self.box = box
+        self.prev = None
+        self.moving_time = 0.0
+        # Let exposure and the new crop settle before trusting the differences
+        self.skip_until = None
+
+    def update(self, frame, now):
+        """True while the mouth keeps moving, False when still, None when there is no region to track."""
+        if self.box is None:
+            return None
+        if self.skip_until is None:
+            self.skip_until = now + self.skip_time
+        self.frames += 1
+        x1, y1, x2, y2 = self.box
+        roi = frame[y1:y2, x1:x2]
+        if self.downscale > 1:
+            roi = cv2.resize(roi, ((x2 - x1) // self.downscale, (y2 - y1) // self.downscale),
+                             interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        prev, self.prev = self.prev, gray
+        dt = now - self.prev_time if self.prev_time is not None else 0.0
+        self.prev_time = now
+        if prev is None or not 0 < dt <= MAX_SAMPLE_GAP:
+            return False
+
+        changed = np.count_nonzero(cv2.absdiff(gray, prev) > config.MOUTH_PIXEL_DELTA)
+        if changed > gray.size * config.MOUTH_ROI_LOST_FRACTION:
+            # The whole region changed: the head moved or the light jumped, not the lips
+            self.lose()
+            return None
+        if now < self.skip_until:
+            return False
+
+        if changed > self.motion_threshold:
+            self.moving_time = min(self.moving_time + dt, 2 * self.motion_time)
+        else:
+            # Decay rather than reset, so a pause between syllables doesn't end the run
+            self.moving_time = max(self.moving_time - dt, 0.0)
+        return self.moving_time >= self.motion_time
+
+    def stats(self):
+        return {'tracking': self.box is not None, 'frames': self.frames, 'lost': self.lost_count}
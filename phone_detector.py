@@ -0,0 +1,236 @@
+"""
+Phone detection with a reduced YOLO cadence.
+
+YOLO is the most expensive stage on CPU-only hosts, but phones don't
+teleport between frames. PhoneDetector runs the model every K frames
+(config.YOLO_EVERY_N_FRAMES, or adapted to the measured inference time)
+and carries the last boxes forward in between with a cheap template
+matching tracker. A lost track forces a fresh YOLO pass on the next frame.
+
+With config.PHONE_ROI_MODE the model runs on small crops around the
+detected hands at a reduced imgsz instead of the full frame, with a
+full-frame pass every config.PHONE_FULL_FRAME_INTERVAL frames as a
+safety net. Crop boxes are mapped back to frame coordinates.
+"""
+
+import math
+import threading
+import time
+
+import cv2
+
+import config
+
+PHONE_CLASS_NAME = "cell phone"
+
+
+def phone_boxes(result, names):
+    """Pull the 'cell phone' boxes out of one ultralytics result as int tuples."""
+    boxes = []
+    for box in result.boxes:
+        cls = int(box.cls[0])
+        if names[cls] == PHONE_CLASS_NAME:
+            boxes.append(tuple(map(int, box.xyxy[0])))
+    return boxes
+
+
+class BoxTracker:
+    """Follow one box by template matching in a small search window around it."""
+
+    def __init__(self, gray, box):
+        frame_h, frame_w = gray.shape[:2]
+        x1, y1, x2, y2 = box
+        self.box = (max(x1, 0), max(y1, 0), min(x2, frame_w), min(y2, frame_h))
+        self.template = self._crop(gray, self.box)
+
+    @staticmethod
+    def _crop(gray, box):
+        x1, y1, x2, y2 = box
+        return gray[y1:y2, x1:x2].copy()
+
+    def update(self, gray):
+        """Return the box's new position, or None if the match is lost."""
+        x1, y1, x2, y2 = self.box
+        w, h = x2 - x1, y2 - y1
+        if w < 4 or h < 4 or self.template.size == 0:
+            return None
+        margin = max(int(max(w, h) * config.PHONE_TRACK_SEARCH_MARGIN), 8)
+        frame_h, frame_w = gray.shape[:2]
+        sx1, sy1 = max(x1 - margin, 0), max(y1 - margin, 0)
+        sx2, sy2 = min(x2 + margin, frame_w), min(y2 + margin, frame_h)
+        search = gray[sy1:sy2, sx1:sx2]
+        if search.shape[0] < h or search.shape[1] < w:
+            return None
+
+        scores = cv2.matchTemplate(search, self.template, cv2.TM_CCOEFF_NORMED)
+        _, best, _, (bx, by) = cv2.minMaxLoc(scores)
+        if best < config.PHONE_TRACK_MIN_SCORE:
+            return None
+
+        self.box = (sx1 + bx, sy1 + by, sx1 + bx + w, sy1 + by + h)
+        self.template = self._crop(gray, self.box)
+        return self.box
+
+
+def hand_rois(hand_landmarks, frame_shape):
+    """Square crop regions (x1, y1, x2, y2) around each hand, with overlapping ones merged."""
+    frame_h, frame_w = frame_shape[:2]
+    rois = []
+    for hl in hand_landmarks:
+        xs = [lm.x for lm in hl.landmark]
+        ys = [lm.y for lm in hl.landmark]
+        cx = (min(xs) + max(xs)) / 2 * frame_w
+        cy = (min(ys) + max(ys)) / 2 * frame_h
+        size = max((max(xs) - min(xs)) * frame_w, (max(ys) - min(ys)) * frame_h)
+        side = max(size * (1 + 2 * config.PHONE_ROI_MARGIN), config.PHONE_ROI_MIN_SIZE)
+        x1, y1 = int(max(cx - side / 2, 0)), int(max(cy - side / 2, 0))
+        x2, y2 = int(min(cx + side / 2, frame_w)), int(min(cy + side / 2, frame_h))
+        if x2 > x1 and y2 > y1:
+            rois.append((x1, y1, x2, y2))
+
+    merged = []
+    for roi in sorted(rois):
+        for i, m in enumerate(merged):
+            if roi[0] < m[2] and m[0] < roi[2] and roi[1] < m[3] and m[1] < roi[3]:
+                merged[i] = (min(roi[0], m[0]), min(roi[1], m[1]), max(roi[2], m[2]), max(roi[3], m[3]))
+                break
+        else:
+            merged.append(roi)
+    return merged
+
+
+class PhoneDetector:
+    """Run YOLO every K frames and track the phone boxes in between."""
+
+    def __init__(self, model, conf=0.5, iou=0.5, every_n=None, adaptive=None, lock=None, service=None):
+        self.model = model
+        # Optional shared BatchInferenceService; when set, frames go through it instead of the model
+        self.service = service
+        self.conf = conf
+        self.iou = iou
+        self.every_n = every_n or config.YOLO_EVERY_N_FRAMES
+        self.adaptive = config.YOLO_ADAPTIVE_CADENCE if adaptive is None else adaptive
+        self.lock = lock or threading.Lock()
+
+        self.trackers = []
+        self.frames_since_inference = None
+        self.force_inference = True
+        self.inference_ms = None
+
+        self.roi_mode = config.PHONE_ROI_MODE
+        self.frames_since_full = None
+
+        self.frames = 0
+        self.yolo_calls = 0
+        self.roi_calls = 0
+        self.tracked_frames = 0
+
+    def _infer(self, frame, imgsz=None):
+        if self.service is not None:
+            return self.service.detect(frame, imgsz=imgsz)
+        kwargs = {'imgsz': imgsz} if imgsz else {}
+        with self.lock:
+            results = self.model(frame, conf=self.conf, iou=self.iou, verbose=False, **kwargs)
+        boxes = []
+        for r in results:
+            boxes.extend(phone_boxes(r, self.model.names))
+        return boxes
+
+    def _infer_rois(self, frame, rois):
+        """Run the model on each crop at PHONE_ROI_IMGSZ and map boxes back to the frame."""
+        if self.service is not None:
+            futures = self.service.submit_many([frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rois], imgsz=config.PHONE_ROI_IMGSZ)
+            # Bounded like the service's detect(): a stuck worker fails the frame, not the loop
+            per_roi = [f.result(timeout=config.WORKER_REQUEST_TIMEOUT) for f in futures]
+        else:
+            crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in rois]
+            with self.lock:
+                results = self.model(crops, conf=self.conf, iou=self.iou, imgsz=config.PHONE_ROI_IMGSZ, verbose=False)
+            per_roi = [phone_boxes(r, self.model.names) for r in results]
+
+        boxes = []
+        for (ox, oy, _, _), roi_boxes in zip(rois, per_roi):
+            for x1, y1, x2, y2 in roi_boxes:
+                boxes.append((x1 + ox, y1 + oy, x2 + ox, y2 + oy))
+        return boxes
+
+    def _run_inference(self, frame, hand_landmarks):
+        """Full-frame or hand-ROI inference; None when ROI mode has nothing to look at."""
+        full_due = (not self.roi_mode or self.frames_since_full is None
+                    or self.frames_since_full >= config.PHONE_FULL_FRAME_INTERVAL)
+        if full_due:
+            self.frames_since_full = 0
+            return self._infer(frame)
+        rois = hand_rois(hand_landmarks, frame.shape) if hand_landmarks else []
+        if not rois:
+            return None
+        self.roi_calls += 1
+        return self._infer_rois(frame, rois)
+
+    def current_interval(self):
+        """Frames between YOLO passes, adapted to the measured inference time if enabled."""
+        if not self.adaptive or self.inference_ms is None:
+            return self.every_n
+        # Keep YOLO's amortised cost per frame near the configured budget
+        k = math.ceil(self.inference_ms / config.YOLO_TARGET_MS_PER_FRAME)
+        return max(1, min(k, config.YOLO_MAX_EVERY_N_FRAMES))
+
+    def _inference_due(self):
+        if self.force_inference or self.frames_since_inference is None:
+            return True
+        return self.frames_since_inference + 1 >= self.current_interval()
+
+    def detect(self, frame, hand_landmarks=None):
+        """Return the phone boxes (x1, y1, x2, y2) for this frame.
+
+        hand_landmarks is the MediaPipe multi_hand_landmarks list and is only
+        used in ROI mode.
+        """
+        self.frames += 1
+        if self.frames_since_full is not None:
+            self.frames_since_full += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        if self._inference_due():
+            start = time.perf_counter()
+            boxes = self._run_inference(frame, hand_landmarks)
+            if boxes is not None:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                self.inference_ms = elapsed_ms if self.inference_ms is None else 0.8 * self.inference_ms + 0.2 * elapsed_ms
+                self.yolo_calls += 1
+                self.frames_since_inference = 0
+                self.force_inference = False
+                self.trackers = [BoxTracker(gray, b) for b in boxes]
+                return boxes
+
+        if self.frames_since_inference is not None:
+            self.frames_since_inference += 1
+        self.tracked_frames += 1
+        boxes = []
+        alive = []
+        for tracker in self.trackers:
+            box = tracker.update(gray)
+            if box is not None:
+                boxes.append(box)
+                alive.append(tracker)
+        if len(alive) < len(self.trackers):
+            # Lost a phone: confirm with the model on the next frame
+            self.force_inference = True
+            self.trackers = alive
+        return boxes
+
+    def reset(self):
+        self.trackers = []
+        self.frames_since_inference = None
+        self.frames_since_full = None
+        self.force_inference = True
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'yolo_calls': self.yolo_calls,
+            'roi_calls': self.roi_calls,
+            'tracked_frames': self.tracked_frames,
+            'yolo_interval': self.current_interval(),
+            'yolo_ms': round(self.inference_ms, 2) if self.inference_ms is not None else None,
+        }
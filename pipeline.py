@@ -0,0 +1,115 @@
+"""
+Per-frame detector stages as a small dependency graph.
+
+FaceMesh, Hands and YOLO don't depend on each other's output (except YOLO
+in hand-ROI mode), yet the detection loop used to run them back to back.
+FramePipeline groups stages into waves by their dependencies and runs
+each wave's stages in parallel on a thread pool; the native MediaPipe,
+PyTorch and ONNX calls release the GIL, so frame wall time drops to
+roughly the slowest detector instead of the sum. Per-stage timings are
+recorded for every frame.
+
+A stage may also carry a `when` predicate that is checked once its
+dependencies are ready; if it returns False the stage is skipped for that
+frame, its output is None, and the skip is counted. This lets a cascade
+skip expensive models whose output can't change the verdict.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+
+class Stage:
+    """One detector step: fn(values) -> output, run once all deps have produced theirs.
+
+    when(values) -> bool, if given, decides per frame whether the stage runs at all.
+    """
+
+    def __init__(self, name, fn, deps=(), when=None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.when = when
+
+
+class FramePipeline:
+    """Run stages wave by wave, stages within a wave in parallel."""
+
+    def __init__(self, stages, max_workers=None):
+        self.stages = list(stages)
+        self.waves = self._build_waves(self.stages)
+        width = max(len(wave) for wave in self.waves) if self.waves else 1
+        workers = max_workers or config.PIPELINE_THREADS
+        # The calling thread runs one stage of each wave itself
+        self.executor = ThreadPoolExecutor(max_workers=max(min(workers, width - 1), 1),
+                                           thread_name_prefix="stage")
+        self.last_timings = {}
+        self.runs = {s.name: 0 for s in self.stages}
+        self.skips = {s.name: 0 for s in self.stages}
+
+    @staticmethod
+    def _build_waves(stages):
+        names = {s.name for s in stages}
+        for s in stages:
+            missing = [d for d in s.deps if d not in names]
+            if missing:
+                raise ValueError(f"Stage {s.name!r} depends on unknown stage(s) {missing}")
+        done, waves, remaining = set(), [], list(stages)
+        while remaining:
+            wave = [s for s in remaining if all(d in done for d in s.deps)]
+            if not wave:
+                raise ValueError("Stage dependencies form a cycle")
+            waves.append(wave)
+            done.update(s.name for s in wave)
+            remaining = [s for s in remaining if s.name not in done]
+        return waves
+
+    @staticmethod
+    def _timed(stage, values):
+        start = time.perf_counter()
+        out = stage.fn(values)
+        return out, (time.perf_counter() - start) * 1000
+
+    def run(self, inputs):
+        """Run every stage for one frame.
+
+        inputs is a dict of per-frame values (e.g. 'frame', 'rgb'); each stage's
+        output is added under its name. Returns (values, timings_ms), where
+        timings_ms has one entry per stage plus 'wall'.
+        """
+        values = dict(inputs)
+        timings = {}
+        start = time.perf_counter()
+        for wave in self.waves:
+            active = []
+            for s in wave:
+                if s.when is None or s.when(values):
+                    active.append(s)
+                else:
+                    values[s.name] = None
+                    self.skips[s.name] += 1
+            if not active:
+                continue
+            futures = [(s, self.executor.submit(self._timed, s, values)) for s in active[1:]]
+            out, ms = self._timed(active[0], values)
+            results = [(active[0], out, ms)]
+            for s, future in futures:
+                out, ms = future.result()
+                results.append((s, out, ms))
+            for s, out, ms in results:
+                values[s.name] = out
+                timings[s.name] = ms
+                self.runs[s.name] += 1
+        timings['wall'] = (time.perf_counter() - start) * 1000
+        self.last_timings = timings
+        return values, timings
+
+    def skip_rates(self):
+        """Fraction of frames each stage was skipped."""
+        return {name: round(self.skips[name] / (self.runs[name] + self.skips[name]), 3)
+                for name in self.runs if self.runs[name] + self.skips[name]}
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,202 @@
+"""
+Temporal rule engine.
+
+Detection loops turn each frame into a handful of discrete events ('head_turn',
+'write', 'suspicious', ...). RuleEngine feeds them to the rules declared in
+config.TEMPORAL_RULES:
+
+    count      N events of a signal within W seconds
+    sequence   signal X followed by signal Y within D seconds
+
+Each rule keeps its own deque-backed window, so old events are evicted from
+the left in O(1) amortized time. Rules are indexed by the signals they
+listen to, and fired rules are held in an expiry heap, so a frame only
+touches the rules its events concern plus the ones currently active; the
+per-frame cost doesn't grow with the number of rules enabled.
+
+A fired rule emits its own name as an event at the same timestamp, so rules
+can build on each other (e.g. count 'lookaway_write' sequences). Rules with
+a 'violation' label are reported back to the loop while active.
+"""
+
+import heapq
+from collections import deque
+
+import config
+
+
+class SlidingWindow:
+    """Event timestamps from the last `window` seconds."""
+
+    def __init__(self, window):
+        self.window = window
+        self.times = deque()
+
+    def add(self, now):
+        self.times.append(now)
+        self.evict(now)
+
+    def evict(self, now):
+        while self.times and now - self.times[0] > self.window:
+            self.times.popleft()
+
+    def __len__(self):
+        return len(self.times)
+
+    def clear(self):
+        self.times.clear()
+
+
+class CountRule:
+    """Fires when `count` events of `signal` fall within `window` seconds.
+
+    Events closer than `min_separation` to the previous counted one are
+    treated as the same event.
+    """
+
+    def __init__(self, name, signal, count, window, min_separation=0.0, violation=None):
+        self.name = name
+        self.signals = (signal,)
+        self.count = count
+        self.min_separation = min_separation
+        self.violation = violation
+        self.events = SlidingWindow(window)
+
+    def feed(self, signal, now):
+        """Record one event; return the time the rule stays active until, or None."""
+        times = self.events.times
+        if times and now - times[-1] < self.min_separation:
+            return None
+        self.events.add(now)
+        if len(times) < self.count:
+            return None
+        # Active until the Nth most recent event leaves the window
+        return times[-self.count] + self.events.window
+
+    def reset(self):
+        self.events.clear()
+
+
+class SequenceRule:
+    """Fires when `then` follows `first` within `within` seconds; each `first` matches once."""
+
+    def __init__(self, name, first, then, within, violation=None):
+        self.name = name
+        self.signals = (first, then)
+        self.first = first
+        self.within = within
+        self.violation = violation
+        self.pending = SlidingWindow(within)
+
+    def feed(self, signal, now):
+        if signal == self.first:
+            self.pending.add(now)
+            return None
+        self.pending.evict(now)
+        if not self.pending:
+            return None
+        self.pending.times.popleft()
+        return now
+
+    def reset(self):
+        self.pending.clear()
+
+
+RULE_TYPES = {'count': CountRule, 'sequence': SequenceRule}
+
+
+def build_rules(specs=None):
+    """Instantiate rules from dicts like those in config.TEMPORAL_RULES."""
+    rules = []
+    for spec in (config.TEMPORAL_RULES if specs is None else specs):
+        spec = dict(spec)
+        kind = spec.pop('type')
+        if kind not in RULE_TYPES:
+            raise ValueError(f"Unknown rule type {kind!r} in rule {spec.get('name')!r}")
+        rules.append(RULE_TYPES[kind](**spec))
+    return rules
+
+
+class RuleEngine:
+    """Evaluate temporal rules incrementally as each frame's events arrive."""
+
+    def __init__(self, rules=None):
+        self.rules = build_rules() if rules is None else list(rules)
+        self.order = {rule.name: i for i, rule in enumerate(self.rules)}
+        self.by_signal = {}
+        for rule in self.rules:
+            for signal in rule.signals:
+                self.by_signal.setdefault(signal, []).append(rule)
+        self.reset()
+
+    def reset(self):
+        for rule in self.rules:
+            rule.reset()
+        self.active = {}   # rule name -> active until
+        self.expiry = []   # heap of (until, rule name); stale entries are skipped
+        self.fired = {rule.name: 0 for rule in self.rules}
+
+    def update(self, now, events):
+        """Feed one frame's events; return the violation labels of active rules, in rule order."""
+        pending = deque(events)
+        while pending:
+            signal = pending.popleft()
+            for rule in self.by_signal.get(signal, ()):
+                until = rule.feed(signal, now)
+                if until is None:
+                    continue
+                if until > self.active.get(rule.name, float('-inf')):
+                    self.active[rule.name] = until
+                    heapq.heappush(self.expiry, (until, rule.name))
+                self.fired[rule.name] += 1
+                pending.append(rule.name)
+
+        while self.expiry and self.expiry[0][0] < now:
+            until, name = heapq.heappop(self.expiry)
+            if self.active.get(name) == until:
+                del self.active[name]
+
+        hits = [self.rules[self.order[name]] for name in self.active]
+        return [rule.violation for rule in sorted(hits, key=lambda r: self.order[r.name]) if rule.violation]
+
+    def stats(self):
+        return {'active': sorted(self.active), 'fired': dict(self.fired)}
+
+
+class HeadMotion:
+    """Turn per-frame face features into 'head_turn' and 'write' events.
+
+    A head turn is a change of yaw direction past turn_threshold; writing is
+    the nose dipping by WRITING_MOVE_PIXELS within WRITING_TIME_WINDOW.
+    """
+
+    def __init__(self, turn_threshold):
+        self.turn_threshold = turn_threshold
+        self.reset()
+
+    def reset(self):
+        self.last_direction = None
+        self.nose_y = deque()
+
+    def update(self, now, face, frame_height):
+        events = []
+        if face is None:
+            return events
+
+        direction = None
+        if face.yaw < -self.turn_threshold:
+            direction = 'left'
+        elif face.yaw > self.turn_threshold:
+            direction = 'right'
+        if direction and direction != self.last_direction:
+            events.append('head_turn')
+            self.last_direction = direction
+
+        y = float(face.points[0, 1]) * frame_height
+        self.nose_y.append((now, y))
+        while now - self.nose_y[0][0] > config.WRITING_TIME_WINDOW:
+            self.nose_y.popleft()
+        if y - self.nose_y[0][1] >= config.WRITING_MOVE_PIXELS:
+            events.append('write')
+            self.nose_y.clear()
+        return events
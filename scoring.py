@@ -0,0 +1,144 @@
+"""
+Per-student violation scoring.
+
+FrameScorer holds the persistence timers, mouth-motion state and temporal
+rule state for one student and turns each frame's FrameFeatures plus phone
+boxes into a Verdict. It does no drawing, speech or I/O, so the live loops
+(web sessions, main.py) and the offline analyser score frames the same way;
+the offline analyser feeds it recorded features in timestamp order.
+
+Everything is measured on the frames' capture timestamps, never on frame
+counts: lip movement is a rate per second and every persistence test is a
+duration, so dropping, skipping or batching frames doesn't change a verdict.
+"""
+
+from typing import NamedTuple, Optional
+
+from rules import HeadMotion, RuleEngine
+
+# Seconds; a longer gap between face samples restarts the lip-movement rate
+MAX_SAMPLE_GAP = 0.5
+
+
+class Verdict(NamedTuple):
+    phone: bool
+    speaking: bool
+    hand: bool
+    rule_violations: list
+    violation: Optional[str]   # highest-priority violation this frame, if any
+
+
+class FrameScorer:
+    """Stateful per-frame scoring; thresholds default to the web app's."""
+
+    def __init__(self, phone_min_time=1.0, mouth_open_min=0.01, mouth_motion_speed=0.06,
+                 mouth_motion_time=0.1, speak_min_time=1.0, hand_near_dist=0.035,
+                 hand_far_dist=0.04, hand_min_time=1.0, head_turn_threshold=0.06, rules=None):
+        self.phone_min_time = phone_min_time
+        self.mouth_open_min = mouth_open_min
+        # Mouth ratio change per second, and how long it must keep moving before speaking counts
+        self.mouth_motion_speed = mouth_motion_speed
+        self.mouth_motion_time = mouth_motion_time
+        self.speak_min_time = speak_min_time
+        self.hand_near_dist = hand_near_dist
+        self.hand_far_dist = hand_far_dist
+        self.hand_min_time = hand_min_time
+        self.rules = RuleEngine(rules)
+        self.head_motion = HeadMotion(turn_threshold=head_turn_threshold)
+        self.reset()
+
+    def reset(self):
+        self.phone_start_time = None
+        self.last_mouth_ratio = None
+        self.last_mouth_time = None
+        self.mouth_motion_start = None
+        self.speaking_start_time = None
+        self.hand_start_time = None
+        self.hand_near_mouth = False
+        self.rules.reset()
+        self.head_motion.reset()
+
+    def update(self, now, feats, phone_boxes=(), face_fresh=True, detection_enabled=True, frame_height=480,
+               mouth_motion=None):
+        """Score one frame captured at `now`; face_fresh is False when FaceMesh was skipped.
+
+        mouth_motion is a MouthMotionDetector reading; when it is not None it
+        replaces the landmark mouth-ratio test for speaking.
+        """
+        if not detection_enabled:
+            self.phone_start_time = None
+            self.hand_start_time = None
+            return Verdict(False, False, False, self.rules.update(now, ()), None)
+
+        phone = False
+        if len(phone_boxes):
+            if self.phone_start_time is None:
+                self.phone_start_time = now
+            phone = now - self.phone_start_time > self.phone_min_time
+
+        speaking = False
+        if mouth_motion is not None:
+            # Restart the landmark test from scratch if the tracker loses the mouth
+            self.last_mouth_ratio = None
+            self.mouth_motion_start = None
+            if mouth_motion and not self.hand_near_mouth:
+                if self.speaking_start_time is None:
+                    self.speaking_start_time = now
+                speaking = now - self.speaking_start_time > self.speak_min_time
+            else:
+                self.speaking_start_time = None
+        elif face_fresh and feats.has_face:
+            ratio = feats.face.mouth_ratio
+            dt = now - self.last_mouth_time if self.last_mouth_time is not None else 0.0
+            speed = 0.0
+            if self.last_mouth_ratio is not None and 0 < dt <= MAX_SAMPLE_GAP:
+                speed = abs(ratio - self.last_mouth_ratio) / dt
+            self.last_mouth_ratio = ratio
+            self.last_mouth_time = now
+
+            if ratio > self.mouth_open_min and speed > self.mouth_motion_speed:
+                if self.mouth_motion_start is None:
+                    self.mouth_motion_start = now
+            else:
+                self.mouth_motion_start = None
+                self.speaking_start_time = None
+
+            moving = self.mouth_motion_start is not None and now - self.mouth_motion_start >= self.mouth_motion_time
+            if moving and not self.hand_near_mouth:
+                if self.speaking_start_time is None:
+                    self.speaking_start_time = now
+                speaking = now - self.speaking_start_time > self.speak_min_time
+
+        hand = False
+        if feats.has_hands and feats.has_face:
+            if (feats.palm_mouth_dist < self.hand_near_dist).any():
+                self.hand_near_mouth = True
+            for distance in feats.palm_mouth_dist:
+                if distance < self.hand_far_dist:
+                    self.hand_start_time = None
+                    continue
+                if self.hand_start_time is None:
+                    self.hand_start_time = now
+                if now - self.hand_start_time > self.hand_min_time:
+                    hand = True
+        else:
+            self.hand_start_time = None
+
+        events = self.head_motion.update(now, feats.face, frame_height)
+        if phone or speaking or hand:
+            events.append('suspicious')
+        rule_violations = self.rules.update(now, events)
+
+        violation = None
+        if phone:
+            violation = "Phone Detected"
+        elif speaking:
+            violation = "Speaking Detected"
+        elif hand:
+            violation = "Hand Gesture Detected"
+        elif rule_violations:
+            violation = rule_violations[0]
+        return Verdict(phone, speaking, hand, rule_violations, violation)
+
+    def stats(self):
+        return self.rules.stats()
@@ -0,0 +1,690 @@
+"""
+Per-student detection sessions.
+
+Each DetectionSession owns its own frame source, broadcast hub, MediaPipe
+models and all of the counters that used to live as module globals in
+app.py. A SessionManager starts and stops sessions by ID so that one
+web process can proctor many students at the same time.
+"""
+
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import config
+import metrics
+from backends import load_yolo
+from aio import Waiters, wait_for as wait_async
+from broadcast import FrameHub
+from events import EventLog
+from capture import FrameGrabber
+from features import face_features, frame_features
+from inference import BatchInferenceService
+from motion import MotionGate
+from mouth import MouthMotionDetector
+from phone_detector import PhoneDetector
+from pipeline import FramePipeline, Stage
+from scoring import FrameScorer
+from workers import ModelWorkerPool
+from utils import (log_violation, save_screenshot, save_violation_to_db,
+                   send_email_alert, send_malpractice_email, speak)
+
+def parse_source(source):
+    """Turn a camera index string like '0' into an int; leave URLs and file paths alone."""
+    if source is None:
+        return 0
+    if isinstance(source, int):
+        return source
+    source = str(source).strip()
+    return int(source) if source.isdigit() else source
+
+
+def create_landmark_models():
+    """A fresh (FaceMesh, Hands) pair; mediapipe is only imported once detection starts."""
+    import mediapipe as mp
+    return (mp.solutions.face_mesh.FaceMesh(refine_landmarks=True, max_num_faces=1),
+            mp.solutions.hands.Hands(max_num_hands=2, min_detection_confidence=0.6, min_tracking_confidence=0.6))
+
+
+def source_allowed(source):
+    """Camera indices, plus the files and URLs listed in config.ALLOWED_SOURCES."""
+    source = parse_source(source)
+    return isinstance(source, int) or source in config.ALLOWED_SOURCES
+
+
+def valid_session_id(session_id):
+    """True if session_id is shaped like a real ID (see config.SESSION_ID_PATTERN)."""
+    return isinstance(session_id, str) and re.fullmatch(config.SESSION_ID_PATTERN, session_id) is not None
+
+
+class DetectionSession:
+    """All detection state for one student and the thread that runs it."""
+
+    def __init__(self, session_id, source=0, yolo_model=None, yolo_lock=None, exam_name=None, inference_service=None,
+                 worker_pool=None, dry_run=False, events=None):
+        self.session_id = session_id
+        self.student_id = session_id
+        self.exam_name = exam_name or config.EXAM_NAME
+        self.source = parse_source(source)
+        self.yolo_model = yolo_model
+        self.yolo_lock = yolo_lock or threading.Lock()
+        # When set, all models run in worker processes instead of this thread
+        self.worker_pool = worker_pool
+        # Benchmarks score violations without speaking, saving or emailing them
+        self.dry_run = dry_run
+        if worker_pool is not None:
+            inference_service = worker_pool.phone_service(session_id)
+
+        self.cap = None
+        self.grabber = None
+        self.phone_detector = PhoneDetector(yolo_model, conf=0.5, iou=0.5, lock=self.yolo_lock, service=inference_service)
+        self.detection_thread = None
+        # Annotated frames for /video_feed; viewers share one encode of the latest frame
+        self.stream = FrameHub(session_id)
+        # Warnings, popups and state changes for /events subscribers
+        self.events = events or EventLog()
+        self.detection_running = False
+        self.detection_stopped = False
+        # Set by stop(), which publishes the final event and closes the log itself
+        self.stop_requested = False
+        self.alert_message = ""
+        self.frames_processed = 0
+        self.scorer = FrameScorer()
+        self.mouth = MouthMotionDetector() if config.MOUTH_MOTION_TRACKING else None
+        self.motion_gate = MotionGate() if config.MOTION_GATE else None
+        self.reset()
+
+    def reset(self):
+        """Reset the per-exam counters before (re)starting detection."""
+        self.warning_count = 0
+        self.last_alert_time = float('-inf')
+        self.malpractice_pending = False
+        self.scorer.reset()
+        if self.mouth is not None:
+            self.mouth.reset()
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        self.last_values = None
+        self.popup_message = ""
+        self.popup_end_time = 0
+        self.exam_start_time = None
+        self.first_frame_seen = False
+        self.exam_ended_announced = False
+        self.detection_stopped = False
+        self.alert_message = ""
+        self.frames_processed = 0
+        self.stage_ms = {}
+        self.last_timings = {}
+        self.violations_booked = 0
+        self.face_checked = False
+        self.last_face = None
+        self.last_nose = None
+        self.face_stable_frames = 0
+        self.pipeline = None
+        self.phone_detector.reset()
+
+    @property
+    def is_running(self):
+        return self.detection_running and self.detection_thread is not None and self.detection_thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        self.reset()
+        if self.events.closed:
+            # A new run gets a new log; IDs carry on so reconnecting clients resume cleanly
+            self.events = EventLog(first_id=self.events.seq)
+        self.stop_requested = False
+        self.detection_running = True
+        self.detection_thread = threading.Thread(target=self.detection_loop, name=f"detection-{self.session_id}", daemon=True)
+        self.detection_thread.start()
+        self.events.publish('state', state='running')
+
+    def stop(self):
+        was_running = self.detection_running
+        self.stop_requested = True
+        self.detection_running = False
+        if self.detection_thread and self.detection_thread is not threading.current_thread():
+            self.detection_thread.join()
+        if was_running:
+            self.events.publish('state', state='stopped')
+        self.events.close()
+        self.stream.notify()
+
+    def pop_alert(self):
+        msg = self.alert_message
+        self.alert_message = ""
+        return msg
+
+    def status(self):
+        return {
+            'session_id': self.session_id,
+            'source': self.source,
+            'running': self.is_running,
+            'stopped': self.detection_stopped,
+            'warning_count': self.warning_count,
+            'frames_processed': self.frames_processed,
+            'stream': self.stream.stats(),
+            **(self.grabber.stats() if self.grabber is not None else {}),
+            'phone_detector': self.phone_detector.stats(),
+            'stage_ms': {k: round(v, 2) for k, v in self.stage_ms.items()},
+            'stage_skip_rate': self.pipeline.skip_rates() if self.pipeline is not None else {},
+            'rules': self.scorer.stats(),
+            'mouth': self.mouth.stats() if self.mouth is not None else None,
+            'motion_gate': self.motion_gate.stats() if self.motion_gate is not None else None,
+        }
+
+    def open_capture(self):
+        if isinstance(self.source, int):
+            cap = cv2.VideoCapture(self.source, cv2.CAP_DSHOW)
+        else:
+            cap = cv2.VideoCapture(self.source)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+        return cap
+
+    def build_pipeline(self, face_mesh, hands):
+        """Detector stages for one frame; face, hands and phone run in parallel.
+
+        With config.CASCADE_GATING, Hands waits for FaceMesh and is skipped when
+        no face is found (the hand rule needs the mouth), and FaceMesh itself
+        drops to every FACE_STABLE_INTERVAL frames once the face is steady.
+        """
+        cascade = config.CASCADE_GATING and self.worker_pool is None
+        if self.worker_pool is not None:
+            # One round trip to the worker returns both landmark sets
+            stages = [Stage('landmarks', lambda v: self.worker_pool.landmarks(self.session_id, v['rgb']))]
+            hands_stage = 'landmarks'
+        elif cascade:
+            stages = [Stage('face', lambda v: face_mesh.process(v['rgb']), when=self.face_due),
+                      Stage('hands', lambda v: hands.process(v['rgb']), deps=['face'], when=self.hands_due)]
+            hands_stage = 'hands'
+        else:
+            stages = [Stage('face', lambda v: face_mesh.process(v['rgb'])),
+                      Stage('hands', lambda v: hands.process(v['rgb']))]
+            hands_stage = 'hands'
+
+        def detect_phones(v):
+            if not v['detection_enabled']:
+                return []
+            hand_landmarks = None
+            if self.phone_detector.roi_mode:
+                hand_results = v['landmarks'][1] if hands_stage == 'landmarks' else v['hands']
+                hand_landmarks = hand_results.multi_hand_landmarks if hand_results is not None else None
+            return self.phone_detector.detect(v['frame'], hand_landmarks)
+
+        # Only hand-ROI mode needs the hands before YOLO can run
+        stages.append(Stage('phone', detect_phones, deps=[hands_stage] if self.phone_detector.roi_mode else []))
+        return FramePipeline(stages)
+
+    def face_due(self, values):
+        """Run FaceMesh unless the face has been steady and was checked recently."""
+        if self.mouth is not None and self.mouth.box is None:
+            # Speaking falls back to landmarks until the mouth is located again
+            return True
+        if not self.face_checked or self.face_stable_frames < config.FACE_STABLE_FRAMES:
+            return True
+        return self.face_stable_frames % config.FACE_STABLE_INTERVAL == 0
+
+    def hands_due(self, values):
+        """Hands only matter next to a face, or when phone ROI mode needs them."""
+        if self.phone_detector.roi_mode:
+            return True
+        if values['face'] is not None:
+            return bool(values['face'].multi_face_landmarks)
+        return self.last_face is not None
+
+    def update_face(self, face_results):
+        """Refresh the face features when FaceMesh ran, and track how steady the face is."""
+        if face_results is None:
+            self.face_stable_frames += 1
+            return
+        self.face_checked = True
+        self.last_face = face = face_features(face_results)
+        if face is None:
+            self.last_nose = None
+            self.face_stable_frames = 0
+            return
+        nose = face.points[0, :2]
+        if self.last_nose is not None and np.abs(nose - self.last_nose).sum() < config.FACE_STABLE_DELTA:
+            self.face_stable_frames += 1
+        else:
+            self.face_stable_frames = 0
+        self.last_nose = nose
+
+    def record_timings(self, timings):
+        for name, ms in timings.items():
+            prev = self.stage_ms.get(name)
+            self.stage_ms[name] = ms if prev is None else 0.9 * prev + 0.1 * ms
+
+    def open_models(self):
+        """Per-session FaceMesh and Hands, or (None, None) when a worker pool runs them.
+
+        MediaPipe graphs keep tracking state between frames, so every
+        session needs its own instances rather than sharing module globals.
+        """
+        if self.worker_pool is not None:
+            return None, None
+        return create_landmark_models()
+
+    def close_models(self, face_mesh, hands):
+        if self.worker_pool is not None:
+            self.worker_pool.close_session(self.session_id)
+        else:
+            face_mesh.close()
+            hands.close()
+
+    def announce(self, text):
+        if not self.dry_run:
+            speak(text)
+
+    def detection_loop(self):
+        face_mesh, hands = self.open_models()
+        pipeline = self.pipeline = self.build_pipeline(face_mesh, hands)
+        end_reason = "source ended"
+
+        try:
+            self.cap = self.open_capture()
+            if not self.cap.isOpened():
+                print(f"[{self.session_id}] Camera not found in detection_loop")
+                end_reason = "camera not found"
+                return
+            self.grabber = FrameGrabber(self.cap, name=f"capture-{self.session_id}").start()
+
+            while self.detection_running:
+                ret, frame, captured_at = self.grabber.read()
+                if not ret:
+                    if self.grabber.ended:
+                        break
+                    continue
+
+                try:
+                    frame = self.process_frame(pipeline, frame, captured_at)
+                    self.observe_metrics(captured_at)
+
+                    self.stream.publish(frame)
+
+                except Exception as e:
+                    print(f"[{self.session_id}] Error processing frame: {e}")
+                    continue
+
+        except Exception as e:
+            print(f"[{self.session_id}] Error in detection loop: {e}")
+            end_reason = f"error: {e}"
+        finally:
+            pipeline.close()
+            if self.grabber is not None:
+                self.grabber.stop()
+            if self.cap is not None:
+                self.cap.release()
+            self.close_models(face_mesh, hands)
+            if self.detection_running:
+                # Ended on its own rather than by stop() or a malpractice booking
+                self.events.publish('state', state='ended', reason=end_reason)
+            if not self.stop_requested:
+                self.events.close()
+            self.stream.notify()
+
+    def observe_metrics(self, captured_at):
+        metrics.FRAMES_PROCESSED.inc()
+        metrics.FRAME_LATENCY.observe(time.monotonic() - captured_at)
+        for stage, ms in self.last_timings.items():
+            if stage != 'wall':
+                metrics.STAGE_LATENCY.observe(ms / 1000.0, stage=stage)
+
+    def process_frame(self, pipeline, frame, now):
+        """Detect, score and annotate one BGR frame captured at `now`; returns the frame.
+
+        `now` is the frame's capture timestamp (monotonic seconds); every
+        timer, cooldown and popup is measured on it, never on the wall clock.
+
+        Stage timings (motion gate, cvtColor, each pipeline stage, mouth, rules, overlay) are
+        folded into self.stage_ms and kept in self.last_timings.
+        """
+        # Exam timer
+        if not self.first_frame_seen:
+            self.first_frame_seen = True
+            self.exam_start_time = now
+            self.announce("Your exam starts now")
+
+        elapsed = int(now - self.exam_start_time)
+
+        if elapsed >= config.EXAM_DURATION_MINUTES * 60 and not self.exam_ended_announced:
+            self.announce("The exam has ended")
+            self.exam_ended_announced = True
+            self.events.publish('state', state='exam_ended')
+
+        detection_enabled = self.warning_count < config.MAX_WARNINGS
+
+        # Run the detectors, independent ones in parallel, unless the frame barely changed
+        t0 = time.perf_counter()
+        reuse = self.motion_gate is not None and self.motion_gate.check(frame, now)
+        gate_ms = (time.perf_counter() - t0) * 1000
+        if reuse:
+            values, timings = self.last_values, {}
+        else:
+            t0 = time.perf_counter()
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            cvt_ms = (time.perf_counter() - t0) * 1000
+            values, timings = pipeline.run({'frame': frame, 'rgb': rgb, 'detection_enabled': detection_enabled})
+            timings['cvtColor'] = cvt_ms
+            self.last_values = values
+            # Only outputs of a run that succeeded may be reused
+            if self.motion_gate is not None:
+                self.motion_gate.accept()
+        if self.motion_gate is not None:
+            timings['gate'] = gate_ms
+        if 'landmarks' in values:
+            face_results, hand_results = values['landmarks']
+        else:
+            face_results, hand_results = values['face'], values['hands']
+        if reuse:
+            # Reused landmarks are not a fresh FaceMesh pass
+            face_results = None
+
+        # A skipped FaceMesh reuses the last face; skipped Hands means no hands
+        face_fresh = face_results is not None
+        self.update_face(face_results)
+
+        # Track the mouth between FaceMesh passes
+        mouth_motion = None
+        if self.mouth is not None and detection_enabled:
+            t0 = time.perf_counter()
+            if face_fresh:
+                self.mouth.locate(self.last_face, frame.shape)
+            mouth_motion = self.mouth.update(frame, now)
+            timings['mouth'] = (time.perf_counter() - t0) * 1000
+
+        # Score the frame (timers, counters, temporal rules)
+        t0 = time.perf_counter()
+        feats = frame_features(self.last_face, hand_results)
+        verdict = self.scorer.update(now, feats, values['phone'], face_fresh=face_fresh,
+                                     detection_enabled=detection_enabled, frame_height=frame.shape[0],
+                                     mouth_motion=mouth_motion)
+        violation_name = verdict.violation
+        timings['rules'] = (time.perf_counter() - t0) * 1000
+
+        if violation_name and now - self.last_alert_time > 6 and detection_enabled:
+            self.book_violation(frame, violation_name, now)
+
+        # UI
+        t0 = time.perf_counter()
+        if detection_enabled:
+            for x1, y1, x2, y2 in values['phone']:
+                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 0, 255), 2)
+                cv2.putText(frame, "Phone", (x1, y1-8), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        if verdict.speaking:
+            cv2.putText(frame, "Speaking", (10, 100), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        if verdict.hand:
+            cv2.putText(frame, "Hand Gesture", (10, 130), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+        cv2.putText(frame, f"Student ID: {self.student_id}", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        cv2.putText(frame, f"Exam: {self.exam_name}", (10, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        cv2.putText(frame, f"Time: {elapsed//60:02d}:{elapsed%60:02d}", (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+
+        if now < self.popup_end_time:
+            cv2.putText(frame, self.popup_message, (160, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        timings['overlay'] = (time.perf_counter() - t0) * 1000
+
+        if self.malpractice_pending and now >= self.popup_end_time:
+            self.show_popup("Malpractice Booked - Exam Terminated", 5, now)
+            self.announce("Malpractice detected. Exam terminated.")
+            if not self.dry_run:
+                send_malpractice_email(self.student_id, self.exam_name)
+            self.detection_stopped = True
+            self.detection_running = False
+            self.malpractice_pending = False
+            self.events.publish('state', state='terminated', reason="malpractice")
+            self.stream.notify()
+
+        self.record_timings(timings)
+        self.last_timings = timings
+        self.frames_processed += 1
+        return frame
+
+    def book_violation(self, frame, violation_name, now):
+        """Count a warning and (unless dry_run) announce, log, screenshot, store and email it."""
+        self.last_alert_time = now
+        self.warning_count += 1
+        self.violations_booked += 1
+        metrics.VIOLATIONS.inc(violation=violation_name)
+        self.events.publish('warning', violation=violation_name, warning_count=self.warning_count)
+        self.show_popup(f"Warning {self.warning_count}: {violation_name}", config.WARNING_POPUP_DURATION, now)
+        if not self.dry_run:
+            speak(self.popup_message)
+            log_violation(f"[{self.student_id}] {self.popup_message}")
+
+            # Save screenshot for every warning
+            screenshot_path = save_screenshot(frame, f"{self.student_id}_{violation_name.lower().replace(' ', '_')}")
+
+            save_violation_to_db(violation_name, self.warning_count, screenshot_path, self.student_id, self.exam_name)
+            send_email_alert(violation_name, self.warning_count, self.student_id, self.exam_name)
+
+        if self.warning_count >= config.MAX_WARNINGS:
+            self.malpractice_pending = True
+            self.alert_message = "🚨 MALPRACTICE BOOKED! "
+            self.events.publish('malpractice', message=self.alert_message, warning_count=self.warning_count)
+
+    def show_popup(self, message, seconds, now):
+        """Overlay `message` on the stream for `seconds` and push it to /events."""
+        self.popup_message = message
+        self.popup_end_time = now + seconds
+        self.events.publish('popup', message=message, seconds=seconds)
+
+
+class SessionManager:
+    """Registry of detection sessions keyed by session (student) ID."""
+
+    def __init__(self, yolo_model=None, max_sessions=None, model_loader=None):
+        """yolo_model may be None: it is then loaded by model_loader (backends.load_yolo)
+        on the first start() or warm_up(), so importing the app stays cheap."""
+        self.yolo_model = yolo_model
+        self.model_loader = model_loader or load_yolo
+        self.model_lock = threading.Lock()
+        self.model_load_seconds = None
+        # One YOLO model is shared by every session; ultralytics predictors are
+        # not safe to call from several threads at once.
+        self.yolo_lock = threading.Lock()
+        # Frames from every session are batched into one forward pass when enabled
+        self.inference_service = None
+        self.worker_pool = None
+        if config.MODEL_WORKERS > 0:
+            self.worker_pool = ModelWorkerPool()
+        self.max_sessions = max_sessions or config.MAX_SESSIONS
+        self.sessions = {}
+        self.lock = threading.Lock()
+        # Signalled when a session is added or replaced; /video_feed waits on it
+        self.changed = threading.Condition(self.lock)
+        self.waiters = Waiters()
+
+    def load_models(self):
+        """Load the shared YOLO model (and its batcher) once; a no-op when worker processes own the models."""
+        if self.worker_pool is not None:
+            return
+        with self.model_lock:
+            if self.yolo_model is None:
+                started = time.perf_counter()
+                self.yolo_model = self.model_loader()
+                self.model_load_seconds = round(time.perf_counter() - started, 2)
+                print(f"YOLO model loaded in {self.model_load_seconds}s")
+            if config.YOLO_BATCHING and self.inference_service is None:
+                self.inference_service = BatchInferenceService(self.yolo_model, conf=0.5, iou=0.5,
+                                                               active_sources=self.running_count)
+
+    def preload(self):
+        """Load read-only model state before gunicorn forks, to be shared copy-on-write.
+
+        Only weights and modules: no inference and no MediaPipe graphs, since
+        both start native thread pools that do not survive fork().
+        """
+        started = time.perf_counter()
+        if self.worker_pool is None:
+            with self.model_lock:
+                if self.yolo_model is None:
+                    self.yolo_model = self.model_loader()
+            import mediapipe  # noqa: F401  (modules and solution files, shared by the workers)
+        print(f"Models preloaded in {time.perf_counter() - started:.1f}s")
+
+    def after_fork(self):
+        """Reinitialise what a forked worker can't inherit: locks, threads and worker processes."""
+        self.model_lock = threading.Lock()
+        self.yolo_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.waiters = Waiters()
+        self.sessions = {}
+        self.inference_service = None
+        if config.MODEL_WORKERS > 0:
+            self.worker_pool = ModelWorkerPool()
+
+    def warm_up(self):
+        """Load and exercise every model ahead of the first session, off the request path."""
+        started = time.perf_counter()
+        try:
+            if self.worker_pool is not None:
+                self.worker_pool.start()
+                self.worker_pool.warm_up()
+            else:
+                self.load_models()
+                dummy = np.zeros((480, 640, 3), dtype=np.uint8)
+                if self.inference_service is not None:
+                    # The batcher calls the model without yolo_lock; go through it so a
+                    # session starting meanwhile never runs the predictor concurrently
+                    self.inference_service.start()
+                    self.inference_service.detect(dummy)
+                else:
+                    with self.yolo_lock:
+                        self.yolo_model(dummy, verbose=False)
+                face_mesh, hands = create_landmark_models()
+                face_mesh.process(dummy)
+                hands.process(dummy)
+                face_mesh.close()
+                hands.close()
+            print(f"Models warmed up in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            print(f"Model warm-up failed: {e}")
+
+    def get(self, session_id):
+        with self.lock:
+            return self.sessions.get(session_id)
+
+    def _open_log(self, session_id):
+        # Caller holds self.lock
+        sess = self.sessions.get(session_id)
+        return sess.events if sess is not None and not sess.events.closed else None
+
+    def events(self, session_id):
+        """The open event log of a started session, or None (never started, or stopped/ended).
+
+        Only sessions create logs, so /events requests for arbitrary IDs cost nothing.
+        """
+        with self.lock:
+            return self._open_log(session_id)
+
+    def wait_events(self, session_id, timeout=None):
+        """events(), waiting up to timeout for the session to (re)start if it has no open log."""
+        with self.changed:
+            self.changed.wait_for(lambda: self._open_log(session_id) is not None, timeout)
+            return self._open_log(session_id)
+
+    async def wait_events_async(self, session_id, timeout=None):
+        """wait_events() for coroutines."""
+        await wait_async(self.lock, self.waiters, lambda: self._open_log(session_id) is not None, timeout)
+        return self.events(session_id)
+
+    def wait_for(self, session_id, timeout=None):
+        """The session with this ID, waiting up to timeout for it to be created; None if it wasn't."""
+        with self.changed:
+            self.changed.wait_for(lambda: session_id in self.sessions, timeout)
+            return self.sessions.get(session_id)
+
+    async def wait_for_async(self, session_id, timeout=None):
+        """wait_for() for coroutines."""
+        await wait_async(self.lock, self.waiters, lambda: session_id in self.sessions, timeout)
+        return self.get(session_id)
+
+    def running_count(self):
+        with self.lock:
+            return sum(1 for s in self.sessions.values() if s.is_running)
+
+    def _evict(self):
+        # Caller holds self.lock. Drop finished sessions nobody is watching any more, so
+        # the registry (and the per-session metric labels) only holds live ones.
+        for session_id, sess in list(self.sessions.items()):
+            if not sess.is_running and sess.stream.viewers == 0 and sess.events.subscribers == 0:
+                del self.sessions[session_id]
+
+    def start(self, session_id, source=0):
+        """Start (or restart) the session with this ID.
+
+        Raises ValueError for a malformed ID or a source that isn't allowed,
+        RuntimeError when the host is full.
+        """
+        if not valid_session_id(session_id):
+            raise ValueError(f"Invalid session ID {session_id!r}")
+        if not source_allowed(source):
+            raise ValueError(f"Source {source!r} is not allowed")
+        # Outside self.lock: the first load, and spawning the model workers, take seconds
+        # and must not block status, SSE or metrics requests
+        self.load_models()
+        if self.worker_pool is not None:
+            self.worker_pool.start()
+        with self.lock:
+            self._evict()
+            sess = self.sessions.get(session_id)
+            if sess is not None and sess.is_running:
+                return sess
+            running = sum(1 for s in self.sessions.values() if s.is_running)
+            if running >= self.max_sessions:
+                raise RuntimeError(f"Maximum of {self.max_sessions} concurrent sessions reached")
+            if sess is None or parse_source(source) != sess.source:
+                old = sess
+                sess = DetectionSession(session_id, source, self.yolo_model, self.yolo_lock,
+                                        inference_service=self.inference_service,
+                                        worker_pool=self.worker_pool,
+                                        events=EventLog(first_id=old.events.seq) if old is not None else None)
+                self.sessions[session_id] = sess
+                self.changed.notify_all()
+                self.waiters.wake_all()
+                if old is not None:
+                    # Viewers of the old session's stream move over to the new one; its
+                    # event subscribers are cut off and reconnect to the new log
+                    old.stream.notify()
+                    old.events.close()
+            if self.inference_service is not None:
+                self.inference_service.start()
+            sess.start()
+            # The run has a fresh event log; wake /events streams waiting for it
+            self.changed.notify_all()
+            self.waiters.wake_all()
+            return sess
+
+    def stop(self, session_id):
+        sess = self.get(session_id)
+        if sess is not None:
+            sess.stop()
+            with self.lock:
+                self._evict()
+        return sess
+
+    def stop_all(self):
+        """Stop every session and the model workers, releasing their shared-memory rings."""
+        with self.lock:
+            sessions = list(self.sessions.values())
+        for sess in sessions:
+            sess.stop()
+        if self.worker_pool is not None:
+            self.worker_pool.stop()
+
+    def status(self):
+        with self.lock:
+            return [s.status() for s in self.sessions.values()]
+
+    def inference_stats(self):
+        if self.worker_pool is not None:
+            return {'batching': False, 'worker_pool': self.worker_pool.stats()}
+        if self.inference_service is None:
+            return {'batching': False}
+        return {'batching': True, **self.inference_service.stats()}
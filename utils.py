@@ -1,5 +1,27 @@
 import os
 import datetime
+import queue
+import smtplib
+import sqlite3
+import threading
+import time
+
+import config
+import metrics
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.webm')
+
+
+def video_files(paths):
+    """Expand directories into the video files they contain (sorted); other paths pass through."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path)
+                                if name.lower().endswith(VIDEO_EXTENSIONS)))
+        else:
+            files.append(path)
+    return files
 
 
 def log_violation(message, log_file="violations.log"):
@@ -43,4 +65,126 @@ def send_alert(frame, message, alerts_log="alerts.log"):
     try:
         save_screenshot(frame, "alert")
     except Exception:
-        pass
\ No newline at end of file
+        pass
+
+
+def save_violation_to_db(violation_name, warning_count, screenshot_path, student_id=None, exam_name=None):
+    """Save violation record to SQLite database."""
+    try:
+        conn = sqlite3.connect('violations.db')
+        c = conn.cursor()
+        c.execute("INSERT INTO violations (student_id, exam_name, violation, time, warning_count, screenshot) VALUES (?, ?, ?, ?, ?, ?)",
+                  (student_id or config.STUDENT_ID, exam_name or config.EXAM_NAME, violation_name, time.strftime('%Y-%m-%d %H:%M:%S'), warning_count, screenshot_path))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error saving to DB: {e}")
+
+
+def send_email_alert(violation_name, warning_count, student_id=None, exam_name=None):
+    """Send Gmail alert for malpractice warning."""
+    def send_email():
+        subject = f"Malpractice Warning: {violation_name}"
+        body = f"""
+Student ID: {student_id or config.STUDENT_ID}
+Exam Name: {exam_name or config.EXAM_NAME}
+Violation Type: {violation_name}
+Time: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}
+Warning Count: {warning_count}
+"""
+        msg = f"Subject: {subject}\n\n{body}"
+
+        try:
+            server = smtplib.SMTP("smtp.gmail.com", 587)
+            server.starttls()
+            server.login(config.EMAIL_ADDRESS, config.EMAIL_PASSWORD)
+            server.sendmail(config.EMAIL_ADDRESS, config.AUTHORITY_EMAIL, msg)
+            server.quit()
+            print("Email sent successfully")
+            metrics.EMAILS.inc(kind="warning", result="sent")
+        except Exception as e:
+            print(f"Failed to send email: {e}")
+            metrics.EMAILS.inc(kind="warning", result="failed")
+
+    threading.Thread(target=send_email, daemon=True).start()
+
+
+def send_malpractice_email(student_id=None, exam_name=None):
+    """Send Gmail alert for malpractice booking to higher authority."""
+    student_id = student_id or config.STUDENT_ID
+    exam_name = exam_name or config.EXAM_NAME
+
+    def send_email():
+        subject = f"URGENT: Malpractice Booked - Student {student_id}"
+        body = f"""
+URGENT MALPRACTICE ALERT
+
+Student has been booked for malpractice during the exam.
+
+Details:
+- Student ID: {student_id}
+- Exam Name: {exam_name}
+- Total Warnings: {config.MAX_WARNINGS}
+- Time of Booking: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}
+- Status: Exam Terminated
+
+All violation records have been logged and screenshots saved.
+
+Please take immediate action.
+
+Exam Surveillance Authority
+"""
+        msg = f"Subject: {subject}\n\n{body}"
+
+        try:
+            server = smtplib.SMTP("smtp.gmail.com", 587)
+            server.starttls()
+            server.login(config.EMAIL_ADDRESS, config.EMAIL_PASSWORD)
+            server.sendmail(config.EMAIL_ADDRESS, config.HIGHER_AUTHORITY_EMAIL, msg)
+            server.quit()
+            print("Malpractice booking email sent successfully")
+            metrics.EMAILS.inc(kind="malpractice", result="sent")
+        except Exception as e:
+            print(f"Failed to send malpractice email: {e}")
+            metrics.EMAILS.inc(kind="malpractice", result="failed")
+
+    threading.Thread(target=send_email, daemon=True).start()
+
+
+_voice_queue = None
+_voice_lock = threading.Lock()
+
+
+def _voice_worker(rate):
+    """Own the pyttsx3 engine on a single thread and speak queued messages."""
+    import pyttsx3
+    engine = pyttsx3.init()
+    engine.setProperty('rate', rate)
+    while True:
+        text = _voice_queue.get()
+        engine.say(text)
+        engine.runAndWait()
+        _voice_queue.task_done()
+
+
+def speak(text, rate=150):
+    """Queue a message for text-to-speech; drops it if something is already queued."""
+    global _voice_queue
+    with _voice_lock:
+        if _voice_queue is None:
+            _voice_queue = queue.Queue()
+            threading.Thread(target=_voice_worker, args=(rate,), daemon=True).start()
+    if _voice_queue.empty():
+        _voice_queue.put(text)
+
+
+def reset_voice_after_fork():
+    """Forget the parent's TTS thread and queue; the child starts its own on first speak()."""
+    global _voice_queue, _voice_lock
+    _voice_queue = None
+    _voice_lock = threading.Lock()
+
+
+def voice_queue_depth():
+    """Messages waiting for text-to-speech (0 before the voice thread starts)."""
+    return _voice_queue.qsize() if _voice_queue is not None else 0
@@ -0,0 +1,349 @@
+"""
+Model worker processes fed through shared-memory frame buffers.
+
+ModelWorkerPool starts config.MODEL_WORKERS processes that own YOLO,
+FaceMesh and Hands. Frames are copied into a per-worker shared-memory ring
+of config.WORKER_SLOTS slots and only the slot number goes over the queue.
+submit() returns a Future; a monitor thread restarts dead workers and
+fails their in-flight requests.
+"""
+
+import itertools
+import multiprocessing
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import config
+
+Landmark = namedtuple('Landmark', ['x', 'y', 'z'])
+
+
+class LandmarkList:
+    """Stand-in for a MediaPipe NormalizedLandmarkList built from an (N, 3) array."""
+
+    def __init__(self, points):
+        self.points = points
+        self._landmark = None
+
+    @property
+    def landmark(self):
+        # Built on first use only; features.py reads self.points directly
+        if self._landmark is None:
+            self._landmark = [Landmark(float(x), float(y), float(z)) for x, y, z in self.points]
+        return self._landmark
+
+
+class LandmarkResults:
+    """Mimics the multi_face_landmarks / multi_hand_landmarks results of MediaPipe."""
+
+    def __init__(self, faces=None, hands=None):
+        self.multi_face_landmarks = [LandmarkList(p) for p in faces] if faces else None
+        self.multi_hand_landmarks = [LandmarkList(p) for p in hands] if hands else None
+
+
+def _landmarks_to_arrays(multi_landmarks):
+    if not multi_landmarks:
+        return []
+    return [np.array([(lm.x, lm.y, lm.z) for lm in ml.landmark], dtype=np.float32) for ml in multi_landmarks]
+
+
+def _worker_main(worker_id, shm_name, slot_bytes, requests, results):
+    """Worker process: own the models and serve requests until told to stop."""
+    import mediapipe as mp
+    from backends import load_yolo
+    from phone_detector import phone_boxes
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    # Loaded on the first phone request so a worker is ready to serve landmarks at once
+    yolo_model = None
+    # MediaPipe keeps tracking state between frames, so each session gets its own graphs
+    session_models = {}
+
+    try:
+        while True:
+            msg = requests.get()
+            if msg is None:
+                break
+            if msg[0] == 'warm_up':
+                if yolo_model is None:
+                    yolo_model = load_yolo()
+                continue
+            if msg[0] == 'close':
+                models = session_models.pop(msg[1], None)
+                if models is not None:
+                    for m in models:
+                        m.close()
+                continue
+
+            _, req_id, session_id, slot, shape, task, kwargs = msg
+            try:
+                frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+                if task == 'phone':
+                    if yolo_model is None:
+                        yolo_model = load_yolo()
+                    kwargs = {k: v for k, v in kwargs.items() if v is not None}
+                    out = []
+                    for r in yolo_model(frame, verbose=False, **kwargs):
+                        out.extend(phone_boxes(r, yolo_model.names))
+                elif task == 'landmarks':
+                    if session_id not in session_models:
+                        session_models[session_id] = (
+                            mp.solutions.face_mesh.FaceMesh(refine_landmarks=True, max_num_faces=1),
+                            mp.solutions.hands.Hands(max_num_hands=2, min_detection_confidence=0.6, min_tracking_confidence=0.6),
+                        )
+                    face_mesh, hands = session_models[session_id]
+                    out = (_landmarks_to_arrays(face_mesh.process(frame).multi_face_landmarks),
+                           _landmarks_to_arrays(hands.process(frame).multi_hand_landmarks))
+                else:
+                    raise ValueError(f"Unknown task {task!r}")
+                del frame
+                results.put((worker_id, req_id, True, out))
+            except Exception as e:
+                results.put((worker_id, req_id, False, f"{type(e).__name__}: {e}"))
+    finally:
+        shm.close()
+
+
+class _Worker:
+    """Parent-side handle for one worker process and its shared-memory ring."""
+
+    def __init__(self, worker_id, ctx, slots, slot_bytes, results):
+        self.worker_id = worker_id
+        self.ctx = ctx
+        self.slot_bytes = slot_bytes
+        self.results = results
+        self.shm = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self.free_slots = queue.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+        self.process = None
+        self.requests = None
+        self.restarts = 0
+        self.spawn()
+
+    def spawn(self):
+        self.new_queue()
+        self.start_process()
+
+    def new_queue(self):
+        # A fresh request queue so a restarted worker never sees its predecessor's backlog
+        self.requests = self.ctx.Queue()
+
+    def start_process(self):
+        self.process = self.ctx.Process(
+            target=_worker_main,
+            args=(self.worker_id, self.shm.name, self.slot_bytes, self.requests, self.results),
+            name=f"model-worker-{self.worker_id}",
+            daemon=True,
+        )
+        self.process.start()
+
+    def write(self, slot, frame):
+        view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+        view[...] = frame
+
+    def close(self):
+        try:
+            self.requests.put(None)
+        except Exception:
+            pass
+        if self.process is not None:
+            self.process.join(timeout=2.0)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.shm.close()
+        self.shm.unlink()
+
+
+class PoolPhoneService:
+    """Adapter giving PhoneDetector the submit()/detect() interface of BatchInferenceService."""
+
+    def __init__(self, pool, session_id, conf=0.5, iou=0.5):
+        self.pool = pool
+        self.session_id = session_id
+        self.conf = conf
+        self.iou = iou
+
+    def submit(self, frame, imgsz=None):
+        return self.pool.submit(self.session_id, 'phone', frame, conf=self.conf, iou=self.iou, imgsz=imgsz)
+
+    def submit_many(self, frames, imgsz=None):
+        return [self.submit(frame, imgsz) for frame in frames]
+
+    def detect(self, frame, imgsz=None, timeout=None):
+        timeout = config.WORKER_REQUEST_TIMEOUT if timeout is None else timeout
+        return self.submit(frame, imgsz).result(timeout)
+
+
+class ModelWorkerPool:
+    """Pool of model-owning worker processes; sessions stick to one worker."""
+
+    def __init__(self, num_workers=None, slots_per_worker=None, slot_bytes=None):
+        self.num_workers = num_workers or config.MODEL_WORKERS
+        self.slots_per_worker = slots_per_worker or config.WORKER_SLOTS
+        self.slot_bytes = slot_bytes or config.WORKER_SLOT_BYTES
+        self.ctx = multiprocessing.get_context(config.WORKER_START_METHOD)
+
+        self.workers = []
+        self.results = None
+        self.reader = None
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.req_ids = itertools.count()
+        self.running = False
+
+        self.requests_done = 0
+        self.requests_failed = 0
+        self.avg_roundtrip_ms = None
+
+    def start(self):
+        with self.lock:
+            if self.running:
+                return self
+            self.running = True
+            self.results = self.ctx.Queue()
+            self.workers = [_Worker(i, self.ctx, self.slots_per_worker, self.slot_bytes, self.results)
+                            for i in range(self.num_workers)]
+        self.reader = threading.Thread(target=self._read_results, name="model-pool-results", daemon=True)
+        self.reader.start()
+        threading.Thread(target=self._monitor, name="model-pool-monitor", daemon=True).start()
+        return self
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.close()
+        self._fail_pending(lambda worker_id: True, "model worker pool stopped")
+        if self.results is not None:
+            self.results.put(None)
+            # Let the reader drain and exit before the queue is torn down at interpreter exit
+            if self.reader is not None and self.reader is not threading.current_thread():
+                self.reader.join(timeout=2.0)
+
+    def _worker_for(self, session_id):
+        return self.workers[hash(session_id) % len(self.workers)]
+
+    def submit(self, session_id, task, frame, **kwargs):
+        """Copy a frame into a free slot of this session's worker and queue the task."""
+        if not self.running:
+            raise RuntimeError("model worker pool is not running")
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"frame of {frame.nbytes} bytes does not fit a {self.slot_bytes} byte slot")
+
+        worker = self._worker_for(session_id)
+        try:
+            # Blocks while the ring is full: natural backpressure
+            slot = worker.free_slots.get(timeout=config.WORKER_REQUEST_TIMEOUT)
+        except queue.Empty:
+            raise RuntimeError(f"no free frame slot on model worker {worker.worker_id}") from None
+        worker.write(slot, frame)
+        future = Future()
+        req_id = next(self.req_ids)
+        # Registered and queued under the lock so a worker restart either fails this
+        # request or hands it to the new process, never drops it with the old queue
+        with self.lock:
+            self.pending[req_id] = (worker.worker_id, slot, future, time.perf_counter())
+            worker.requests.put(('task', req_id, session_id, slot, frame.shape, task, kwargs))
+        return future
+
+    def landmarks(self, session_id, rgb, timeout=None):
+        """Run FaceMesh and Hands for one RGB frame; returns (face_results, hand_results)."""
+        timeout = config.WORKER_REQUEST_TIMEOUT if timeout is None else timeout
+        faces, hands = self.submit(session_id, 'landmarks', rgb).result(timeout)
+        return LandmarkResults(faces=faces), LandmarkResults(hands=hands)
+
+    def phone_service(self, session_id, conf=0.5, iou=0.5):
+        return PoolPhoneService(self, session_id, conf, iou)
+
+    def warm_up(self):
+        """Have every worker load YOLO now rather than on its first phone request."""
+        for worker in list(self.workers):
+            worker.requests.put(('warm_up',))
+
+    def close_session(self, session_id):
+        """Drop the session's MediaPipe graphs in its worker."""
+        if self.running and self.workers:
+            self._worker_for(session_id).requests.put(('close', session_id))
+
+    def _read_results(self):
+        while True:
+            msg = self.results.get()
+            if msg is None:
+                break
+            worker_id, req_id, ok, payload = msg
+            with self.lock:
+                entry = self.pending.pop(req_id, None)
+                if entry is None:
+                    continue
+                _, slot, future, started = entry
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                self.avg_roundtrip_ms = elapsed_ms if self.avg_roundtrip_ms is None else 0.9 * self.avg_roundtrip_ms + 0.1 * elapsed_ms
+                if ok:
+                    self.requests_done += 1
+                else:
+                    self.requests_failed += 1
+                worker = self.workers[worker_id] if worker_id < len(self.workers) else None
+            if worker is not None:
+                worker.free_slots.put(slot)
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _fail_pending(self, match, reason):
+        with self.lock:
+            failed = self._take_pending(match)
+            workers = list(self.workers)
+        self._fail(failed, workers, reason)
+
+    def _take_pending(self, match):
+        """Remove and return the pending entries whose worker ID matches; hold self.lock."""
+        failed = [entry for entry in self.pending.values() if match(entry[0])]
+        self.pending = {req_id: entry for req_id, entry in self.pending.items() if not match(entry[0])}
+        return failed
+
+    @staticmethod
+    def _fail(failed, workers, reason):
+        for worker_id, slot, future, _ in failed:
+            if worker_id < len(workers):
+                workers[worker_id].free_slots.put(slot)
+            future.set_exception(RuntimeError(reason))
+
+    def _monitor(self):
+        while self.running:
+            time.sleep(config.WORKER_HEALTH_INTERVAL)
+            for worker in list(self.workers):
+                if not self.running or worker.process.is_alive():
+                    continue
+                print(f"Model worker {worker.worker_id} died (exit code {worker.process.exitcode}), restarting")
+                # Swap the queue and collect its requests in one step: submit() holds the
+                # same lock, so nothing can be queued to the dead process in between
+                with self.lock:
+                    worker.new_queue()
+                    failed = self._take_pending(lambda worker_id: worker_id == worker.worker_id)
+                    workers = list(self.workers)
+                self._fail(failed, workers, "model worker died")
+                worker.restarts += 1
+                worker.start_process()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'workers': [{'worker_id': w.worker_id,
+                             'alive': w.process.is_alive(),
+                             'restarts': w.restarts,
+                             'free_slots': w.free_slots.qsize()} for w in self.workers],
+                'pending': len(self.pending),
+                'requests_done': self.requests_done,
+                'requests_failed': self.requests_failed,
+                'avg_roundtrip_ms': round(self.avg_roundtrip_ms, 2) if self.avg_roundtrip_ms is not None else None,
+            }